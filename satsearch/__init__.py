@@ -1,4 +1,3 @@
-from satsearch.search import Search
 from satsearch.version import __version__
 
 import logging
@@ -6,3 +5,11 @@ import logging
 # quiet loggers
 logging.getLogger('urllib3').propagate = False
 logging.getLogger('requests').propagate = False
+
+
+def __getattr__(name):
+    """ Import Search when first used, so importing the package (e.g., for the CLI) is fast """
+    if name == 'Search':
+        from satsearch.search import Search
+        return Search
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
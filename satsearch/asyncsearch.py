@@ -0,0 +1,183 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+from satstac import Collection, Item, ItemCollection
+from satsearch import fastjson
+from satsearch.search import SatSearchError, Search
+from urllib.parse import urljoin
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncSearch(Search):
+    """ One search query (possibly multiple pages), made with asyncio
+
+    Mirrors `Search`, but `found`, `query`, `collection`, `items` and `table` are coroutines and
+    `iter_items` is an async generator. Requests are made with an aiohttp ClientSession
+    (created when first needed unless one is passed in) and at most `concurrency` are made
+    at once. Use as an async context manager, or call `close()`, to close the session.
+    """
+
+    def __init__(self, url=os.getenv('STAC_API_URL', None), session=None, cache=None, concurrency=10, **kwargs):
+        """ Initialize an AsyncSearch object with parameters """
+        if aiohttp is None:
+            raise SatSearchError("AsyncSearch requires aiohttp, install with `pip install sat-search[async]`")
+        super(AsyncSearch, self).__init__(url=url, cache=cache, **kwargs)
+        self.session = session
+        self._own_session = session is None
+        self.concurrency = concurrency
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        """ Close the session, if created by this AsyncSearch """
+        if self._own_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def found(self, headers=None):
+        """ Small query to determine total number of hits """
+        kwargs = dict(self.kwargs)
+        kwargs['limit'] = 0
+        kwargs.pop('fields', None)
+        url = urljoin(self.url, 'search')
+        return self._found(await self.query(url=url, headers=headers, **kwargs))
+
+    async def query(self, url=None, headers=None, **kwargs):
+        """ Get request """
+        url = url or urljoin(self.url, 'search')
+        if self.session is None:
+            self.session = aiohttp.ClientSession()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Query URL: %s, Body: %s' % (url, json.dumps(kwargs)))
+        content = None if self.cache is None else self.cache.get(url, body=kwargs, headers=headers)
+        cached, status = content is not None, 200
+        async with self._semaphore:
+            start = time.perf_counter()
+            if not cached:
+                async with self.session.post(url, json=kwargs, headers=headers) as response:
+                    content = await response.read()
+                    status = response.status
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Response: {content}")
+            elapsed = time.perf_counter() - start
+        # API error
+        if status != 200:
+            self._emit('request', url=url, status=status, nbytes=len(content), elapsed=elapsed, decode=0, cached=cached)
+            raise SatSearchError(content.decode(), status=status)
+        if self.cache is not None and not cached:
+            self.cache.set(url, content, body=kwargs, headers=headers)
+        start = time.perf_counter()
+        data = fastjson.loads(content)
+        self._emit('request', url=url, status=status, nbytes=len(content), elapsed=elapsed,
+                   decode=time.perf_counter() - start, cached=cached)
+        return data
+
+    async def collection(self, cid, headers=None):
+        """ Get a Collection record """
+        url = urljoin(self.url, 'collections/%s' % cid)
+        start = time.perf_counter()
+        collection = Collection(await self.query(url=url, headers=headers))
+        self._emit('collection', id=cid, elapsed=time.perf_counter() - start)
+        return collection
+
+    async def _fetch_collection(self, cid, headers=None):
+        """ Get a Collection record, or None if it can't be retrieved """
+        try:
+            return await self.collection(cid, headers=headers)
+        except Exception as err:
+            logger.debug('Unable to retrieve collection %s: %s' % (cid, err))
+            return None
+
+    def _collection_task(self, cid, headers=None):
+        """ Task retrieving a Collection record, started the first time the Collection is seen """
+        if cid not in self._collections:
+            self._collections[cid] = asyncio.ensure_future(self._fetch_collection(cid, headers=headers))
+        return self._collections[cid]
+
+    async def pages(self, limit=10000, page_limit=500, headers=None):
+        """ Iterate through the pages of results for this search, following next links """
+        limit = self.limit or limit
+        nextlink = self._first_link(headers=headers)
+        count = 0
+        while nextlink and count < limit:
+            url, body = self._link_request(nextlink, page_limit=min(page_limit, limit - count), headers=headers)
+            try:
+                resp = await self.query(url=url, headers=headers, **body)
+            except SatSearchError as err:
+                if err.status == 400 and 'fields' in self.kwargs:
+                    # the API may not support the fields extension
+                    logger.warning('Search with fields failed, requesting complete Items: %s' % err)
+                    del self.kwargs['fields']
+                    continue
+                raise
+            count = self._page_received(resp, count, limit)
+            self._emit('page', nitems=len(resp['features']))
+            yield resp
+            nextlink = self._next_link(resp)
+
+    async def iter_items(self, limit=10000, page_limit=500, headers=None):
+        """ Yield the Items for this search one page at a time, fetching new Collections concurrently """
+        async for page in self.pages(limit=limit, page_limit=page_limit, headers=headers):
+            start = time.perf_counter()
+            items = [Item(feature) for feature in page['features']]
+            self._emit('items', nitems=len(items), elapsed=time.perf_counter() - start)
+            cids = set([item._data['collection'] for item in items if 'collection' in item._data])
+            tasks = {cid: self._collection_task(cid, headers=headers) for cid in cids}
+            await asyncio.gather(*tasks.values())
+            for item in items:
+                if 'collection' in item._data:
+                    item._collection = tasks[item._data['collection']].result()
+                yield item
+
+    async def items(self, limit=10000, page_limit=500, headers=None):
+        """ Return all of the Items and Collections for this search
+
+        Collection records are requested as soon as they are seen, concurrently with the
+        remaining pages, rather than after all pages have been retrieved
+        """
+        items = []
+        async for page in self.pages(limit=limit, page_limit=page_limit, headers=headers):
+            for feature in page['features']:
+                if 'collection' in feature:
+                    self._collection_task(feature['collection'], headers=headers)
+            start = time.perf_counter()
+            items += [Item(feature) for feature in page['features']]
+            self._emit('items', nitems=len(page['features']), elapsed=time.perf_counter() - start)
+
+        cids = set([item._data['collection'] for item in items if 'collection' in item._data])
+        cols = dict(zip(cids, await asyncio.gather(*[self._collections[c] for c in cids])))
+        collections = [c for c in cols.values() if c is not None]
+        logger.debug(f"Found: {len(items)}")
+        return ItemCollection(items, collections=collections)
+
+    async def table(self, limit=10000, page_limit=500, headers=None, properties=None, features=True):
+        """ Return the Items for this search as a compact `satsearch.table.ItemTable` (see `Search.table`) """
+        from satsearch.table import ItemTable
+        table = ItemTable(properties=properties, features=features)
+        async for page in self.pages(limit=limit, page_limit=page_limit, headers=headers):
+            for feature in page['features']:
+                if 'collection' in feature:
+                    self._collection_task(feature['collection'], headers=headers)
+            start = time.perf_counter()
+            table.extend(page['features'])
+            self._emit('items', nitems=len(page['features']), elapsed=time.perf_counter() - start)
+        cids = sorted(set(table.collection) - set([None]))
+        collections = await asyncio.gather(*[self._collection_task(c, headers=headers) for c in cids])
+        table._collections = [c for c in collections if c is not None]
+        return table
@@ -0,0 +1,139 @@
+import logging
+import os
+import re
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from satstac import ItemCollection
+from satsearch.geojson import save_items
+from satsearch.search import Search, sort_items
+
+logger = logging.getLogger(__name__)
+
+# Item property listing the names of the AOIs an Item matched
+AOIS_PROPERTY = 'aois'
+
+
+def read_aois(geojson):
+    """ List of (name, geometry) for each AOI in a GeoJSON Geometry, Feature or FeatureCollection
+
+    AOIs are named by the Feature id, or its 'name' or 'id' property, or else by position
+    """
+    if geojson['type'] == 'FeatureCollection':
+        features = geojson['features']
+    elif geojson['type'] == 'Feature':
+        features = [geojson]
+    else:
+        features = [{'geometry': geojson}]
+    aois, names = [], set()
+    for i, feature in enumerate(features):
+        props = feature.get('properties', None) or {}
+        name = str(feature.get('id', props.get('name', props.get('id', 'aoi-%s' % i))))
+        if name in names:
+            name = '%s-%s' % (name, i)
+        names.add(name)
+        aois.append((name, feature['geometry']))
+    return aois
+
+
+class BatchSearch(object):
+    """ Many searches, one for each AOI and/or datetime window, run concurrently
+
+    The searches share a session, cache, and the Collection records retrieved, so each
+    Collection is fetched once for the whole batch.
+    """
+
+    def __init__(self, aois=None, datetimes=None, url=os.getenv('STAC_API_URL', None), session=None, cache=None,
+                 hooks=None, **kwargs):
+        """ Initialize a batch from a list of (name, geometry) AOIs (see `read_aois`) and/or of datetimes
+
+        Every AOI is searched over every datetime, with the other search parameters in kwargs
+        """
+        self.cache = cache
+        self.searches = []
+        collections, lock = {}, threading.Lock()
+        for name, geometry in (aois or [(None, None)]):
+            for dt in (datetimes or [kwargs.get('datetime', None)]):
+                _kwargs = dict(kwargs)
+                if _kwargs.get('page_sizer', None) is not None:
+                    # each search sizes its own pages
+                    _kwargs['page_sizer'] = _kwargs['page_sizer'].copy()
+                if geometry is not None:
+                    _kwargs['intersects'] = geometry
+                if dt is not None:
+                    _kwargs['datetime'] = dt
+                search = Search.search(url=url, session=session, cache=cache, hooks=hooks, **_kwargs)
+                search._collections = collections
+                search._collections_lock = lock
+                self.searches.append((name, dt, search))
+        self.sortby = self.searches[0][2].kwargs.get('sortby', None)
+
+    def __len__(self):
+        return len(self.searches)
+
+    def found(self, threads=8, headers=None):
+        """ Number found by each search, as a list of (AOI name, datetime, number found) """
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            counts = list(executor.map(lambda s: s[2].found(headers=headers), self.searches))
+        return [(name, dt, count) for (name, dt, search), count in zip(self.searches, counts)]
+
+    def items(self, threads=8, limit=10000, page_limit=500, headers=None):
+        """ Return the Items found by any of the searches, tagged with the AOIs they matched
+
+        At most `threads` searches are paged through at once. Items found by more than one
+        search are returned once, with the names of all the AOIs they matched listed in the
+        'aois' property
+        """
+        logger.debug('Running %s searches with %s threads' % (len(self.searches), threads))
+        items, aois = {}, {}
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = executor.map(
+                lambda s: list(s[2].iter_items(limit=limit, page_limit=page_limit, headers=headers)), self.searches)
+            for (name, dt, search), result in zip(self.searches, results):
+                for item in result:
+                    items.setdefault(item.id, item)
+                    names = aois.setdefault(item.id, [])
+                    if name is not None and name not in names:
+                        names.append(name)
+        for id, item in items.items():
+            if aois[id]:
+                item._data.setdefault('properties', {})[AOIS_PROPERTY] = aois[id]
+        items = list(items.values())
+        if self.sortby is not None:
+            items = sort_items(items, self.sortby)
+        collections = self.searches[0][2]._collections
+        cids = set([item._data['collection'] for item in items if 'collection' in item._data])
+        logger.debug('Found %s items in %s searches' % (len(items), len(self.searches)))
+        return ItemCollection(items, collections=[collections[c] for c in cids if collections.get(c) is not None])
+
+
+def split_aois(items):
+    """ Split Items tagged by `BatchSearch.items` into an ItemCollection for each AOI, by name """
+    aois = {}
+    for item in items:
+        for name in item.properties.get(AOIS_PROPERTY, []):
+            aois.setdefault(name, []).append(item)
+    collections = {c.id: c for c in items._collections}
+    results = {}
+    for name, _items in aois.items():
+        cids = set([item._data['collection'] for item in _items if 'collection' in item._data])
+        results[name] = ItemCollection(_items, collections=[collections[c] for c in cids if c in collections])
+    return results
+
+
+def aoi_filename(filename, name):
+    """ Filename for the results of one AOI, the AOI name added before the extension(s) """
+    dirname, basename = os.path.split(filename)
+    parts = basename.split('.', 1)
+    parts[0] = '%s-%s' % (parts[0], re.sub(r'[^\w.-]', '_', name))
+    return os.path.join(dirname, '.'.join(parts))
+
+
+def save_aois(items, filename, ndjson=False, compress=None):
+    """ Save the Items for each AOI to its own file (see `aoi_filename`), returning the filenames """
+    filenames = []
+    for name, _items in split_aois(items).items():
+        fname = aoi_filename(filename, name)
+        save_items(_items, fname, ndjson=ndjson, compress=compress, collections=_items._collections)
+        filenames.append(fname)
+    return filenames
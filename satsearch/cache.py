@@ -0,0 +1,119 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# default time to live (seconds) of cached responses, by endpoint
+TTLS = {
+    'collections': 24 * 60 * 60,
+    'search': 5 * 60
+}
+
+
+class Cache(object):
+    """ Base class for caches of API responses, keyed on the URL, JSON body and headers of a request """
+
+    def __init__(self, ttls=None):
+        self.ttls = dict(TTLS, **(ttls or {}))
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(url, body=None, headers=None):
+        """ Key of a request, with the body canonicalized """
+        request = json.dumps({'url': url, 'body': body or {}, 'headers': headers or {}}, sort_keys=True)
+        return hashlib.sha256(request.encode()).hexdigest()
+
+    def ttl(self, url):
+        """ Time to live of a response from this URL """
+        if '/collections/' in url:
+            return self.ttls['collections']
+        return self.ttls['search']
+
+    def get(self, url, body=None, headers=None):
+        """ Get a cached response (bytes), or None """
+        content = self._get(self.key(url, body=body, headers=headers))
+        if content is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return content
+
+    def set(self, url, content, body=None, headers=None):
+        """ Cache a response (bytes) """
+        ttl = self.ttl(url)
+        if ttl > 0:
+            self._set(self.key(url, body=body, headers=headers), content, ttl)
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _set(self, key, content, ttl):
+        raise NotImplementedError
+
+    def __str__(self):
+        return 'Cache: %s hits, %s misses' % (self.hits, self.misses)
+
+
+class SQLiteCache(Cache):
+    """ Cache of API responses in a SQLite database, evicting the least recently used beyond max_size bytes """
+
+    def __init__(self, path, max_size=100 * 1024 * 1024, ttls=None):
+        super(SQLiteCache, self).__init__(ttls=ttls)
+        self.max_size = max_size
+        if os.path.dirname(path) != '' and not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.db.execute('CREATE TABLE IF NOT EXISTS responses '
+                        '(key TEXT PRIMARY KEY, content BLOB, size INTEGER, expires REAL, accessed REAL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+
+    @classmethod
+    def open(cls, cache_dir, **kwargs):
+        """ Open the cache database in cache_dir """
+        return cls(os.path.join(cache_dir, 'sat-search-cache.sqlite'), **kwargs)
+
+    def _get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.db.execute('SELECT content, expires FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self.db.execute('DELETE FROM responses WHERE key = ?', (key,))
+                return None
+            self.db.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+        return row[0]
+
+    def _set(self, key, content, ttl):
+        now = time.time()
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                            (key, content, len(content), now + ttl, now))
+            self.evict()
+
+    def evict(self):
+        """ Remove expired responses, then the least recently used until under max_size """
+        self.db.execute('DELETE FROM responses WHERE expires < ?', (time.time(),))
+        size = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if size <= self.max_size:
+            return
+        keys = []
+        for key, _size in self.db.execute('SELECT key, size FROM responses ORDER BY accessed'):
+            if size <= self.max_size:
+                break
+            keys.append((key,))
+            size -= _size
+        self.db.executemany('DELETE FROM responses WHERE key = ?', keys)
+        logger.debug('Evicted %s responses from cache' % len(keys))
+
+    def clear(self):
+        """ Remove all cached responses """
+        with self.lock:
+            self.db.execute('DELETE FROM responses')
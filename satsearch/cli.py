@@ -2,14 +2,24 @@ import argparse
 import json
 import logging
 import os
+import re
 import sys
 
 from .version import __version__
-from satsearch import Search
-from satstac import ItemCollection
-from satstac.utils import dict_merge
+from satsearch.geometry import ENVELOPES
+
+# other modules (and requests and satstac) are imported only where needed, for fast startup
+
+logger = logging.getLogger(__name__)
 
 API_URL = os.getenv('STAC_API_URL', None)
+CACHE_DIR = os.getenv('SATSEARCH_CACHE_DIR', None)
+
+# number of ids searched for at once, when getting Items by id
+ID_CHUNK_SIZE = 100
+
+# search parameters that can also filter loaded Items
+FILTERS = ['ids', 'collections', 'bbox', 'intersects', 'datetime', 'query', 'sortby', 'limit']
 
 
 class SatUtilsParser(argparse.ArgumentParser):
@@ -31,6 +41,8 @@ class SatUtilsParser(argparse.ArgumentParser):
         self.download_group.add_argument('--download', help='Download assets', default=None, nargs='*')
         h = 'Acknowledge paying egress costs for downloads (if in requester pays bucket on AWS)'
         self.download_group.add_argument('--requester-pays', help=h, default=False, action='store_true', dest='requester_pays')
+        h = 'Number of assets to download at once'
+        self.download_group.add_argument('--download-threads', help=h, default=None, type=int, dest='download_threads')
 
         self.output_parser = argparse.ArgumentParser(add_help=False)
         self.output_group = self.output_parser.add_argument_group('output options')
@@ -39,6 +51,10 @@ class SatUtilsParser(argparse.ArgumentParser):
         h = 'Print calendar showing dates'
         self.output_group.add_argument('--print-cal', help=h, dest='printcal')
         self.output_group.add_argument('--save', help='Save results as GeoJSON', default=None)
+        h = 'Save results as newline delimited GeoJSON'
+        self.output_group.add_argument('--ndjson', help=h, default=None, action='store_true')
+        h = 'Compress saved results with gzip (default if save filename ends in .gz)'
+        self.output_group.add_argument('--gzip', help=h, default=None, action='store_true')
 
     def parse_args(self, *args, **kwargs):
         """ Parse arguments """
@@ -61,10 +77,21 @@ class SatUtilsParser(argparse.ArgumentParser):
                     data = json.loads(f.read())
                     if data['type'] == 'Feature':
                         args['intersects'] = data['geometry']
+                    elif data['type'] == 'FeatureCollection' and len(data['features']) > 1:
+                        # search each Feature
+                        from satsearch.batch import read_aois
+                        args['aois'] = read_aois(data)
+                        del args['intersects']
                     elif data['type'] == 'FeatureCollection':
                         args['intersects'] = data['features'][0]['geometry']
                     else:
                         args['intersects'] = data
+        if args.get('per_aoi', False) and 'aois' not in args:
+            self.error('--per-aoi requires --intersects to be a FeatureCollection of more than one Feature')
+
+        if 'ids_file' in args:
+            with open(args.pop('ids_file')) as f:
+                args['ids'] = args.get('ids', []) + [line.strip() for line in f if line.strip()]
 
         # If a filename, read the JSON file
         if 'headers' in args:
@@ -87,25 +114,86 @@ class SatUtilsParser(argparse.ArgumentParser):
         sparser = subparser.add_parser('search', help='Perform new search of items', parents=parents)
         """ Adds search arguments to a parser """
         parser.search_group = sparser.add_argument_group('search options')
-        parser.search_group.add_argument('-c', '--collections', help='Name of collection', nargs='*')
-        h = 'One or more scene IDs from provided collection (ignores other parameters)'
-        parser.search_group.add_argument('--ids', help=h, nargs='*', default=None)
-        parser.search_group.add_argument('--bbox', help='Bounding box (min lon, min lat, max lon, max lat)', nargs=4)
-        parser.search_group.add_argument('--intersects', help='GeoJSON Feature (file or string)')
-        parser.search_group.add_argument('--datetime', help='Single date/time or begin and end date/time (e.g., 2017-01-01/2017-02-15)')
-        parser.search_group.add_argument('-q', '--query', nargs='*', help='Query properties of form KEY=VALUE (<, >, <=, >=, = supported)')
-        parser.search_group.add_argument('--sortby', help='Sort by fields', nargs='*')
+        parser.add_filter_arguments(parser.search_group)
         h = 'Only output how many Items found'
         parser.search_group.add_argument('--found', help=h, action='store_true', default=False)
         parser.search_group.add_argument('--url', help='URL of the API', default=API_URL)
         parser.search_group.add_argument('--headers', help='Additional request headers (JSON file or string)', default=None)
-        parser.search_group.add_argument('--limit', help='Limits the total number of items returned', default=None)
+        h = 'Reuse a pooled connection for all requests, retrying failures this many times'
+        parser.search_group.add_argument('--retries', help=h, default=None, type=int)
+        parser.search_group.add_argument('--timeout', help='Request timeout in seconds', default=None, type=float)
+        h = 'Number of pooled connections to keep alive'
+        parser.search_group.add_argument('--pool-size', help=h, default=None, type=int, dest='pool_size')
+        h = 'Cache API responses in this directory'
+        parser.search_group.add_argument('--cache-dir', help=h, default=CACHE_DIR, dest='cache_dir')
+        h = 'Do not use cached API responses'
+        parser.search_group.add_argument('--no-cache', help=h, default=None, action='store_true', dest='no_cache')
+        h = 'Only return Items newer than those seen in previous runs, tracked in this state file'
+        parser.search_group.add_argument('--since', help=h, default=None)
+        h = 'Datetime property used to determine which Items are newer'
+        parser.search_group.add_argument('--since-field', help=h, default=None, dest='since_field')
+        h = 'Print a summary of request timing and throughput'
+        parser.search_group.add_argument('--stats', help=h, default=None, action='store_true')
+        h = 'Split the datetime interval into this many shards, searched concurrently'
+        parser.search_group.add_argument('--datetime-shards', help=h, default=None, type=int, dest='datetime_shards')
+        h = 'Split the bbox into this many tiles on a side, searched concurrently'
+        parser.search_group.add_argument('--bbox-shards', help=h, default=None, type=int, dest='bbox_shards')
+        h = 'Number of shards to search at once'
+        parser.search_group.add_argument('--threads', help=h, default=None, type=int)
+        h = 'Add the Items found to this local index (see load)'
+        parser.search_group.add_argument('--index', help=h, default=None)
+        h = 'Send the bbox or convex hull of --intersects to the API and filter results by the exact geometry locally'
+        parser.search_group.add_argument('--envelope', help=h, default=None, choices=ENVELOPES)
+        h = 'Make at most this many requests per second'
+        parser.search_group.add_argument('--rate-limit', help=h, default=None, type=float, dest='rate_limit')
+        h = 'Number of requests that can be made at once within the rate limit'
+        parser.search_group.add_argument('--burst', help=h, default=None, type=int)
+        h = 'SQLite database sharing the rate limit with other processes (e.g., parallel sat-search jobs)'
+        parser.search_group.add_argument('--rate-limit-db', help=h, default=None, dest='rate_limit_db')
+        h = ('Only get these fields of Items, prefixed with - to exclude them (e.g., id properties.eo:cloud_cover -links). '
+             'Unless saving or indexing results, the fields needed by --print-md, --print-cal, and --download are used')
+        parser.search_group.add_argument('--fields', help=h, nargs='*', default=None)
+        h = 'Search for this many ids at a time, concurrently (default %s, used if there are more ids)' % ID_CHUNK_SIZE
+        parser.search_group.add_argument('--id-chunk-size', help=h, default=None, type=int, dest='id_chunk_size')
+        h = 'Get Items by id that searching does not find from each of --collections'
+        parser.search_group.add_argument('--ids-direct', help=h, default=None, action='store_true', dest='ids_direct')
+        h = 'Save ids of Items not found to this file'
+        parser.search_group.add_argument('--missing-ids', help=h, default=None, dest='missing_ids')
+        h = 'Number of Items to request per page (the first page, if adapting the page size)'
+        parser.search_group.add_argument('--page-limit', help=h, default=None, type=int, dest='page_limit')
+        h = 'Adapt the page size to API response times, between this minimum (default 10)'
+        parser.search_group.add_argument('--min-page-limit', help=h, default=None, type=int, dest='min_page_limit')
+        h = 'Adapt the page size to API response times, up to this maximum (default 10000)'
+        parser.search_group.add_argument('--max-page-limit', help=h, default=None, type=int, dest='max_page_limit')
+        h = 'Search each of these dates/times or intervals, along with each Feature of --intersects'
+        parser.search_group.add_argument('--datetimes', help=h, nargs='*', default=None)
+        h = 'Save the Items matching each Feature of --intersects to its own file, named after --save'
+        parser.search_group.add_argument('--per-aoi', help=h, default=None, action='store_true', dest='per_aoi')
 
         parents.append(parser.download_parser)
         lparser = subparser.add_parser('load', help='Load items from previous search', parents=parents)
-        lparser.add_argument('items', help='GeoJSON file of Items')
+        lparser.add_argument('items', help='GeoJSON files of Items', nargs='*')
+        parser.load_group = lparser.add_argument_group('filter options')
+        parser.add_filter_arguments(parser.load_group)
+        h = 'Local index of Items to filter, any GeoJSON files given are added to it'
+        parser.load_group.add_argument('--index', help=h, default=None)
         return parser
 
+    @staticmethod
+    def add_filter_arguments(group):
+        """ Add arguments for filtering Items to an argument group """
+        group.add_argument('-c', '--collections', help='Name of collection', nargs='*')
+        h = 'One or more scene IDs from provided collection (ignores other parameters)'
+        group.add_argument('--ids', help=h, nargs='*', default=None)
+        h = 'File of Item ids to get, one per line (along with any --ids)'
+        group.add_argument('--ids-file', help=h, default=None, dest='ids_file')
+        group.add_argument('--bbox', help='Bounding box (min lon, min lat, max lon, max lat)', nargs=4)
+        group.add_argument('--intersects', help='GeoJSON Feature, or FeatureCollection of AOIs to search (file or string)')
+        group.add_argument('--datetime', help='Single date/time or begin and end date/time (e.g., 2017-01-01/2017-02-15)')
+        group.add_argument('-q', '--query', nargs='*', help='Query properties of form KEY=VALUE (<, >, <=, >=, = supported)')
+        group.add_argument('--sortby', help='Sort by fields', nargs='*')
+        group.add_argument('--limit', help='Limits the total number of items returned', default=None)
+
     class KeyValuePair(argparse.Action):
         """ Custom action for getting arbitrary key values from argparse """
         def __call__(self, parser, namespace, values, option_string=None):
@@ -116,21 +204,141 @@ class SatUtilsParser(argparse.ArgumentParser):
 
 def main(items=None, printmd=None, printcal=None,
          found=False, filename_template='${collection}/${date}/${id}',
-         save=None, download=None, requester_pays=False, headers=None, **kwargs):
+         save=None, ndjson=False, gzip=None, download=None, requester_pays=False, download_threads=4, headers=None,
+         retries=None, timeout=None, pool_size=None, cache_dir=None, no_cache=False,
+         since=None, since_field='datetime', datetime_shards=None, bbox_shards=None, threads=8, stats=False,
+         index=None, aois=None, datetimes=None, per_aoi=False, page_limit=None, min_page_limit=None,
+         max_page_limit=None, rate_limit=None, burst=1, rate_limit_db=None, id_chunk_size=None, ids_direct=False,
+         missing_ids=None, **kwargs):
     """ Main function for performing a search """
-    
+    table = False
+    if per_aoi and aois is None:
+        raise ValueError('Saving per AOI requires aois')
+
     if items is None:
         ## if there are no items then perform a search
-        search = Search.search(headers=headers, **kwargs)
+        from satsearch.batch import BatchSearch
+        from satsearch.search import Search
+        limiter = None
+        if rate_limit is not None and rate_limit_db is not None:
+            from urllib.parse import urlsplit
+            from satsearch.ratelimit import SQLiteRateLimiter
+            # a bucket for each API
+            limiter = SQLiteRateLimiter(rate_limit_db, rate_limit, burst=burst,
+                                        name=urlsplit(kwargs.get('url', None) or API_URL or '').netloc)
+        elif rate_limit is not None:
+            from satsearch.ratelimit import RateLimiter
+            limiter = RateLimiter(rate_limit, burst=burst)
+        if retries is not None or timeout is not None or pool_size is not None or limiter is not None:
+            from satsearch.session import Session
+            kwargs['session'] = Session(pool_size=pool_size or 10, timeout=timeout,
+                                        retries=3 if retries is None else retries, rate_limiter=limiter)
+        if cache_dir is not None and not no_cache:
+            from satsearch.cache import SQLiteCache
+            kwargs['cache'] = SQLiteCache.open(cache_dir)
+        if min_page_limit is not None or max_page_limit is not None:
+            from satsearch.paging import PageSizer
+            kwargs['page_sizer'] = PageSizer(size=page_limit, min_size=min_page_limit or 10,
+                                             max_size=max_page_limit or 10000)
+        elif page_limit is not None:
+            from satsearch.paging import PageSizer
+            kwargs['page_sizer'] = PageSizer(size=page_limit, min_size=page_limit, max_size=page_limit)
+        if stats:
+            from satsearch.stats import Stats
+            stats = Stats()
+            kwargs['hooks'] = [stats]
+        if 'fields' not in kwargs and save is None and index is None and since is None:
+            # only what is printed or downloaded is needed
+            kwargs['fields'] = infer_fields(printmd=printmd, printcal=printcal, download=download,
+                                            filename_template=filename_template, sortby=kwargs.get('sortby', None))
+        if aois is not None or datetimes is not None:
+            search = BatchSearch(aois=aois, datetimes=datetimes, **kwargs)
+        else:
+            search = Search.search(headers=headers, **kwargs)
         ## Commenting out found logic until functions correctly.
-        if found:
+        if found and isinstance(search, BatchSearch):
+            num = search.found(threads=threads, headers=headers)
+            for name, dt, n in num:
+                print('%s items found for %s' % (n, ' '.join([s for s in (name, dt) if s is not None])))
+        elif found:
              num = search.found(headers=headers)
              print('%s items found' % num)
+        if found:
+             if search.cache is not None:
+                 logger.info(search.cache)
+             if limiter is not None:
+                 logger.info(limiter)
+             if stats:
+                 print(stats.report())
              return num
-        items = search.items(headers=headers)
+        if isinstance(search, BatchSearch):
+            results = search.items(threads=threads, headers=headers)
+        elif since is not None:
+            from satsearch.incremental import incremental_items
+            results = incremental_items(since, field=since_field, headers=headers, **kwargs)
+        elif id_chunk_size is not None or ids_direct or len(kwargs.get('ids', None) or []) > ID_CHUNK_SIZE:
+            results = search.items_by_id(chunk_size=id_chunk_size or ID_CHUNK_SIZE, threads=threads,
+                                         direct=ids_direct, headers=headers)
+            if search.missing_ids:
+                print('%s ids not found' % len(search.missing_ids))
+            if missing_ids is not None:
+                with open(missing_ids, 'w') as f:
+                    f.write(''.join(id + '\n' for id in search.missing_ids))
+        elif datetime_shards is not None or bbox_shards is not None:
+            results = search.sharded_items(datetime_shards=datetime_shards or 1, bbox_shards=bbox_shards or 1,
+                                           threads=threads, headers=headers)
+        elif save is None and index is None:
+            # compact table of results for printing, with only the properties printed
+            properties = (printmd or []) + ([printcal] if printcal else [])
+            results = search.table(headers=headers, properties=properties)
+            table = True
+        else:
+            results = search.items(headers=headers, stream=save is not None)
+        if index is not None:
+            from satsearch.index import Index
+            if save is None or per_aoi:
+                # split_aois needs the collection of results, not a stream
+                Index(index).add(results)
+            else:
+                results = Index(index).feed(results)
+        if per_aoi and save is not None:
+            from satsearch.batch import save_aois
+            for filename in save_aois(results, save, ndjson=ndjson, compress=gzip):
+                logger.info('Saved %s' % filename)
+            save = None
+        # keep items in memory only if needed for other outputs
+        keep = printmd is not None or printcal or download is not None
+        saved = None
+        if save is not None:
+            # write items to file as they arrive
+            from satsearch.geojson import ItemWriter
+            from satstac import ItemCollection
+            items = []
+            with ItemWriter(save, ndjson=ndjson, compress=gzip) as writer:
+                for item in results:
+                    writer.write(item)
+                    if keep:
+                        items.append(item)
+            items = ItemCollection(items, collections=list(writer.collections.values()))
+            saved, save = writer.count, None
+        else:
+            items = results
+        if search.cache is not None:
+            logger.info(search.cache)
+        if limiter is not None:
+            logger.info(limiter)
+        if stats:
+            print(stats.report())
+        if saved is not None and not keep:
+            print('%s items found' % saved)
+            return saved
     else:
-        # otherwise, load a search from a file
-        items = ItemCollection.open(items)
+        # otherwise, load a search from files and/or a local index
+        filters = {k: v for k, v in kwargs.items() if k in FILTERS}
+        if aois is not None:
+            # Items intersecting any of the AOIs
+            filters['intersects'] = {'type': 'GeometryCollection', 'geometries': [g for name, g in aois]}
+        items = load(items if isinstance(items, list) else [items], index=index, **filters)
 
     print('%s items found' % len(items))
 
@@ -144,17 +352,68 @@ def main(items=None, printmd=None, printcal=None,
 
     # save all metadata in JSON file
     if save is not None:
-        items.save(filename=save)
+        from satsearch.geojson import save_items
+        save_items(items, save, ndjson=ndjson, compress=gzip, collections=items._collections)
 
     # download files given `download` keys
     if download is not None:
         if 'ALL' in download:
             # get complete set of assets
             download = set([k for i in items for k in i.assets])
-        for key in download:
-            items.download(key=key, filename_template=filename_template, requester_pays=requester_pays)
+        from satsearch.download import Downloader, DOWNLOAD_TIMEOUT
+        downloader = Downloader(threads=download_threads, requester_pays=requester_pays,
+                                timeout=timeout or DOWNLOAD_TIMEOUT)
+        downloader.download(items, download, filename_template=filename_template)
+        print(downloader)
+
+    # Items as with any other search, the table is only for the output
+    return items.to_items() if table else items
+
+
+def infer_fields(printmd=None, printcal=None, download=None, filename_template='${collection}/${date}/${id}',
+                 sortby=None):
+    """ STAC fields of Items needed to print metadata (printmd), a calendar (printcal), download assets, and sort """
+    include = ['id', 'type', 'collection', 'bbox', 'properties.datetime']
+    keys = (printmd or []) + ([printcal] if printcal else [])
+    exclude = ['links', 'geometry']
+    if download is None:
+        exclude.append('assets')
+    else:
+        # all assets, since keys may also be band common names (see Item.asset)
+        include.append('assets')
+        # properties used in the filenames
+        keys += re.findall(r'\$\{([^}]+)\}', filename_template or '')
+    include += ['properties.%s' % k for k in keys if k not in ('id', 'collection', 'date')]
+    # sharded and batch searches are sorted locally
+    for sort in (sortby or []):
+        field = sort['field'] if isinstance(sort, dict) else sort.lstrip('+-')
+        if field not in ('id', 'collection'):
+            include.append(field if '.' in field else 'properties.%s' % field)
+    return {'include': list(dict.fromkeys(include)), 'exclude': exclude}
+
+
+def load(filenames, index=None, **kwargs):
+    """ Load Items from GeoJSON files, through a local index if given one or any filters (see FILTERS) """
+    from satsearch.geojson import open_items
+    from satsearch.index import Index
+    from satsearch.search import parse_query, parse_sortby
+    from satstac import ItemCollection
 
-    return items
+    def _open(filename):
+        return ItemCollection.open(filename) if filename.startswith('https') else open_items(filename)
+    if index is None and not kwargs and len(filenames) == 1:
+        return _open(filenames[0])
+    index = Index(index or ':memory:')
+    for filename in filenames:
+        items = _open(filename)
+        index.add(items, collections=items._collections)
+    if isinstance(kwargs.get('query', None), list):
+        kwargs['query'] = parse_query(kwargs['query'])
+    if isinstance(kwargs.get('sortby', None), list):
+        kwargs['sortby'] = parse_sortby(kwargs['sortby'])
+    if isinstance(kwargs.get('intersects', None), str):
+        kwargs['intersects'] = json.loads(kwargs['intersects'])
+    return index.search(**kwargs)
 
 
 def cli():
@@ -0,0 +1,153 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+import traceback
+
+from concurrent.futures import ThreadPoolExecutor
+from satstac.utils import get_s3_signed_url, mkdirp
+from satsearch.session import Session
+
+logger = logging.getLogger(__name__)
+
+# multihash codes of supported file:checksum hash functions
+MULTIHASH_FUNCTIONS = {
+    '12': hashlib.sha256,
+    'd5': hashlib.md5
+}
+
+# default (connect, read) timeout in seconds of asset requests
+DOWNLOAD_TIMEOUT = 60
+
+
+def checksum_matches(filename, multihash, chunk_size=1024 * 1024):
+    """ Check a file against a multihash (hex) checksum, returning None if the hash function is unsupported """
+    func = MULTIHASH_FUNCTIONS.get(multihash[0:2], None)
+    if func is None:
+        return None
+    h = func()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest() == multihash[4:]
+
+
+class Downloader(object):
+    """ Download assets of many Items concurrently
+
+    Assets are streamed to disk in chunks, to a .part file that is renamed once complete. An
+    interrupted download is resumed from the .part file with an HTTP Range request, and files
+    that already exist are skipped if their size (and checksum, if the asset has one) match.
+    Without a session, one is made with `timeout` for every request.
+    """
+
+    def __init__(self, threads=4, chunk_size=1024 * 1024, session=None, requester_pays=False, headers={},
+                 overwrite=False, timeout=DOWNLOAD_TIMEOUT):
+        self.threads = threads
+        self.chunk_size = chunk_size
+        self.session = Session(pool_size=threads, timeout=timeout) if session is None else session
+        self.requester_pays = requester_pays
+        self.headers = headers
+        self.overwrite = overwrite
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """ Reset download statistics """
+        self.nbytes = 0
+        self.downloaded = 0
+        self.skipped = 0
+        self.failed = 0
+        self.elapsed = 0
+
+    def __str__(self):
+        mb = self.nbytes / 1024 / 1024
+        rate = mb / self.elapsed if self.elapsed > 0 else 0
+        return ('Downloaded %s files (%.1f MB) in %.1f seconds (%.2f MB/s), %s skipped, %s failed'
+                % (self.downloaded, mb, self.elapsed, rate, self.skipped, self.failed))
+
+    def download(self, items, keys, filename_template='${collection}/${date}/${id}'):
+        """ Download assets `keys` of all items, returning the filenames downloaded (or already present) """
+        start = time.time()
+        tasks = [(item, key) for item in items for key in keys]
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            filenames = list(executor.map(lambda t: self.download_asset(t[0], t[1], filename_template), tasks))
+        self.elapsed += time.time() - start
+        logger.info(str(self))
+        return [f for f in filenames if f is not None]
+
+    def request(self, href, offset=0, method='GET'):
+        """ Make a (ranged) request for an asset, signing S3 URLs """
+        url, headers = href, dict(self.headers)
+        if 's3.amazonaws.com' in href:
+            url, signed_headers = get_s3_signed_url(href, rtype=method, requester_pays=self.requester_pays)
+            headers.update(signed_headers or {})
+        if offset > 0:
+            headers['Range'] = 'bytes=%s-' % offset
+        return self.session.request(method, url, headers=headers, stream=True)
+
+    def is_complete(self, filename, asset):
+        """ Check if an existing file is a complete download of an asset """
+        if 'file:size' in asset and os.path.getsize(filename) != asset['file:size']:
+            return False
+        if 'file:checksum' in asset:
+            matches = checksum_matches(filename, asset['file:checksum'], chunk_size=self.chunk_size)
+            if matches is not None:
+                return matches
+        if 'file:size' in asset:
+            return True
+        # compare to the size reported by the server, downloading again if it can't be checked
+        resp = self.request(asset['href'], method='HEAD')
+        resp.close()
+        size = resp.headers.get('Content-Length', None)
+        return resp.status_code == 200 and size is not None and int(size) == os.path.getsize(filename)
+
+    def download_asset(self, item, key, filename_template='${collection}/${date}/${id}'):
+        """ Download the asset `key` (or common_name) of an Item, returning the filename or None if failed """
+        asset = item.asset(key)
+        if asset is None:
+            return None
+        ext = os.path.splitext(asset['href'])[1]
+        filename = item.get_path(filename_template) + '_' + key + ext
+        try:
+            if os.path.exists(filename) and not self.overwrite:
+                if self.is_complete(filename, asset):
+                    logger.debug('Skipping existing %s' % filename)
+                    with self.lock:
+                        self.skipped += 1
+                    return filename
+            self.fetch(asset, filename)
+        except Exception as e:
+            logger.error('Unable to download %s: %s' % (asset['href'], str(e)))
+            logger.debug(traceback.format_exc())
+            with self.lock:
+                self.failed += 1
+            return None
+        with self.lock:
+            self.downloaded += 1
+        return filename
+
+    def fetch(self, asset, filename):
+        """ Stream an asset to filename, resuming a partial download if there is one """
+        logger.info('Downloading %s as %s' % (asset['href'], filename))
+        mkdirp(os.path.dirname(filename))
+        partname = filename + '.part'
+        offset = os.path.getsize(partname) if os.path.exists(partname) and not self.overwrite else 0
+        resp = self.request(asset['href'], offset=offset)
+        if resp.status_code == 416:
+            # nothing left to download
+            resp.close()
+        elif resp.status_code in (200, 206):
+            mode = 'ab' if resp.status_code == 206 else 'wb'
+            with open(partname, mode) as f:
+                for chunk in resp.iter_content(chunk_size=self.chunk_size):
+                    f.write(chunk)
+                    with self.lock:
+                        self.nbytes += len(chunk)
+        else:
+            raise Exception("Unable to download file %s: %s" % (asset['href'], resp.text))
+        if 'file:checksum' in asset and checksum_matches(partname, asset['file:checksum']) is False:
+            os.remove(partname)
+            raise Exception('Checksum of %s does not match' % filename)
+        os.replace(partname, filename)
@@ -0,0 +1,67 @@
+""" JSON encoding and decoding with the fastest library installed
+
+orjson is used if installed, then simdjson (for decoding only), otherwise the standard library
+json module. Set the SATSEARCH_JSON environment variable (orjson, simdjson or json) or call
+`use()` to choose one.
+"""
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+BACKENDS = ['orjson', 'simdjson', 'json']
+
+# name of the library in use
+backend = None
+
+
+def use(name=None):
+    """ Use the named JSON library, or the fastest one installed """
+    global backend
+    available = {'orjson': orjson is not None, 'simdjson': simdjson is not None, 'json': True}
+    if name is None:
+        name = [b for b in BACKENDS if available[b]][0]
+    elif not available.get(name, False):
+        logger.warning('JSON library %s is not available, using json' % name)
+        name = 'json'
+    backend = name
+    logger.debug('Using %s for JSON' % backend)
+
+
+def loads(data):
+    """ Decode JSON (str or bytes) """
+    if backend == 'orjson':
+        return orjson.loads(data)
+    if backend == 'simdjson':
+        return simdjson.loads(data)
+    return json.loads(data)
+
+
+def dumpb(obj):
+    """ Encode as JSON bytes """
+    if backend == 'orjson':
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # e.g., integers larger than 64 bits
+            pass
+    return json.dumps(obj).encode()
+
+
+def dumps(obj):
+    """ Encode as a JSON string """
+    return dumpb(obj).decode()
+
+
+use(os.getenv('SATSEARCH_JSON', None))
@@ -0,0 +1,212 @@
+import gzip
+import json
+import logging
+import os
+import tempfile
+
+from satstac import Collection, Item, ItemCollection
+from satstac.catalog import STAC_VERSION
+from satsearch import fastjson
+
+logger = logging.getLogger(__name__)
+
+
+def open_file(filename, mode, compress=None):
+    """ Open a text file, gzipped if compress is True or the filename ends in .gz """
+    if compress is None:
+        compress = filename.endswith('.gz')
+    if compress:
+        return gzip.open(filename, mode + 't', encoding='utf-8')
+    return open(filename, mode, encoding='utf-8')
+
+
+class ItemWriter(object):
+    """ Write Items to disk as they arrive
+
+    Items are written as a single file STAC GeoJSON FeatureCollection (the same as
+    `ItemCollection.save`), or as newline delimited GeoJSON Features with ndjson=True. Output
+    goes to a temporary file that is renamed to filename when closed, so filename is never
+    left half written. If writing fails, what has been written is kept as filename.partial.
+    Any properties are saved as the properties of the FeatureCollection.
+    """
+
+    def __init__(self, filename, ndjson=False, compress=None, id='STAC', description='Single file STAC',
+                 properties=None):
+        self.filename = filename
+        self.ndjson = ndjson
+        self.count = 0
+        self.closed = False
+        # Collections of the Items written, by id
+        self.collections = {}
+        fd, self.tmpfilename = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)),
+                                                prefix='.%s.' % os.path.basename(filename), suffix='.tmp')
+        os.close(fd)
+        # mkstemp files are private, give it the permissions of a new file
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(self.tmpfilename, 0o666 & ~umask)
+        self.f = open_file(self.tmpfilename, 'w', compress=filename.endswith('.gz') if compress is None else compress)
+        if not ndjson:
+            header = {
+                'id': id,
+                'description': description,
+                'stac_version': STAC_VERSION,
+                'stac_extensions': ['single-file-stac'],
+                'type': 'FeatureCollection',
+            }
+            if properties is not None:
+                header['properties'] = properties
+            self.f.write(json.dumps(header)[:-1] + ', "features": [')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.closed:
+            return
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, item):
+        """ Write an Item, Feature dictionary, or Feature already encoded as JSON (str or bytes) """
+        if isinstance(item, Item):
+            if item._collection is not None:
+                self.collections[item._collection.id] = item._collection
+            item = item._data
+        if isinstance(item, bytes):
+            item = item.decode()
+        elif not isinstance(item, str):
+            item = fastjson.dumps(item)
+        if self.ndjson:
+            self.f.write(item + '\n')
+        else:
+            self.f.write((', ' if self.count > 0 else '') + item)
+        self.count += 1
+
+    def close(self, collections=[]):
+        """ Finish writing, adding collections (along with those of the Items written) """
+        for c in collections:
+            self.collections[c.id] = c
+        if not self.ndjson:
+            cols = fastjson.dumps([c._data for c in self.collections.values()])
+            self.f.write('], "collections": %s, "links": []}' % cols)
+        self.f.close()
+        self.closed = True
+        os.replace(self.tmpfilename, self.filename)
+        logger.debug('Saved %s items to %s' % (self.count, self.filename))
+
+    def abort(self):
+        """ Stop writing, keeping anything written as filename.partial """
+        self.f.close()
+        self.closed = True
+        os.replace(self.tmpfilename, self.filename + '.partial')
+        logger.warning('Saving to %s failed, %s items saved in %s.partial' % (self.filename, self.count, self.filename))
+
+
+def save_items(items, filename, ndjson=False, compress=None, collections=[]):
+    """ Write an iterable of Items to filename as they are produced, returning the number written """
+    if isinstance(items, LazyItemCollection):
+        # no need to decode the Items
+        items = items.features()
+    with ItemWriter(filename, ndjson=ndjson, compress=compress) as writer:
+        for item in items:
+            writer.write(item)
+        writer.close(collections=collections)
+    return writer.count
+
+
+def open_items(filename, lazy=False):
+    """ Open a GeoJSON FeatureCollection or newline delimited GeoJSON file (optionally gzipped)
+
+    With lazy=True a `LazyItemCollection` is returned
+    """
+    logger.debug('Opening %s' % filename)
+    with open_file(filename, 'r') as f:
+        data = f.read()
+    try:
+        data = fastjson.loads(data)
+    except ValueError:
+        lines = [line for line in data.splitlines() if line.strip()]
+        if lazy:
+            # Features are already encoded one per line
+            return LazyItemCollection([line.encode() for line in lines])
+        data = {'features': [fastjson.loads(line) for line in lines]}
+    if data.get('type', None) == 'Feature':
+        # newline delimited GeoJSON with a single Feature
+        data = {'features': [data]}
+    collections = [Collection(col) for col in data.get('collections', [])]
+    if lazy:
+        items = LazyItemCollection(collections=collections)
+        for feature in data['features']:
+            items.append(feature)
+        return items
+    items = [Item(feature) for feature in data['features']]
+    return ItemCollection(items, collections=collections)
+
+
+class LazyItems(object):
+    """ Sequence of the Items in a LazyItemCollection, decoded when accessed """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __len__(self):
+        return len(self.collection._features)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.collection.item(i) for i in range(len(self))[index]]
+        return self.collection.item(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.collection.item(i)
+
+
+class LazyItemCollection(ItemCollection):
+    """ ItemCollection that keeps each Item as JSON (bytes), decoding it only when accessed
+
+    Holding encoded Items takes a fraction of the memory of decoded ones, and Items that are
+    never accessed are never decoded. Each access decodes the Item again, so convert Items
+    that are used repeatedly to a list.
+    """
+
+    def __init__(self, features=[], collections=[]):
+        self._collections = collections
+        self._features = list(features)
+
+    @property
+    def _items(self):
+        return LazyItems(self)
+
+    @_items.setter
+    def _items(self, items):
+        self._features = []
+        for item in items:
+            self.append(item)
+
+    def append(self, feature):
+        """ Add an Item, Feature dictionary, or Feature encoded as JSON bytes """
+        if isinstance(feature, Item):
+            feature = feature._data
+        if not isinstance(feature, bytes):
+            # copy, as encoders may return bytes with a larger buffer than needed
+            feature = memoryview(fastjson.dumpb(feature)).tobytes()
+        self._features.append(feature)
+
+    def features(self):
+        """ Iterate through the Features encoded as JSON bytes """
+        return iter(self._features)
+
+    def item(self, index):
+        """ Decode the Item at index """
+        item = Item(fastjson.loads(self._features[index]))
+        cid = item._data.get('collection', None)
+        if cid is not None:
+            item._collection = self.collection(cid)
+        return item
+
+    def __iter__(self):
+        return iter(self._items)
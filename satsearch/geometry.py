@@ -0,0 +1,201 @@
+""" Plain Python GeoJSON geometry operations, used to search with a simpler AOI than the one given """
+import math
+
+# shapes of AOI that can be sent to the API in place of a geometry
+ENVELOPES = ['bbox', 'hull']
+
+
+def points(geometry):
+    """ All positions in a GeoJSON geometry """
+    def _points(c):
+        if len(c) > 0 and isinstance(c[0], (int, float)):
+            yield c
+        else:
+            for _c in c:
+                yield from _points(_c)
+    if geometry['type'] == 'GeometryCollection':
+        for g in geometry['geometries']:
+            yield from points(g)
+    else:
+        yield from _points(geometry['coordinates'])
+
+
+def envelope(geometry):
+    """ Bounding box [minx, miny, maxx, maxy] of a GeoJSON geometry """
+    minx = miny = math.inf
+    maxx = maxy = -math.inf
+    for p in points(geometry):
+        minx, miny, maxx, maxy = min(minx, p[0]), min(miny, p[1]), max(maxx, p[0]), max(maxy, p[1])
+    return [minx, miny, maxx, maxy]
+
+
+def bbox_polygon(bbox):
+    """ GeoJSON Polygon of a bounding box """
+    minx, miny, maxx, maxy = bbox
+    return {'type': 'Polygon', 'coordinates': [[[minx, miny], [maxx, miny], [maxx, maxy], [minx, maxy], [minx, miny]]]}
+
+
+def _cross(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+def convex_hull(geometry):
+    """ GeoJSON Polygon of the convex hull of a geometry (monotone chain) """
+    pts = sorted(set([(p[0], p[1]) for p in points(geometry)]))
+    if len(pts) < 3:
+        return bbox_polygon(envelope(geometry))
+    lower, upper = [], []
+    for p in pts:
+        while len(lower) >= 2 and _cross(lower[-2], lower[-1], p) <= 0:
+            lower.pop()
+        lower.append(p)
+    for p in reversed(pts):
+        while len(upper) >= 2 and _cross(upper[-2], upper[-1], p) <= 0:
+            upper.pop()
+        upper.append(p)
+    ring = lower[:-1] + upper[:-1]
+    return {'type': 'Polygon', 'coordinates': [[list(p) for p in ring + [ring[0]]]]}
+
+
+def simplify(geometry, method='bbox'):
+    """ Envelope of a geometry that contains it, its bbox or convex hull """
+    if method == 'bbox':
+        return bbox_polygon(envelope(geometry))
+    if method == 'hull':
+        return convex_hull(geometry)
+    raise ValueError('Unknown envelope %s, use one of %s' % (method, ', '.join(ENVELOPES)))
+
+
+def _parts(geometry):
+    """ Rings (closed, of Polygons) and lines (open) of a geometry """
+    t = geometry['type']
+    if t == 'GeometryCollection':
+        rings, lines = [], []
+        for g in geometry['geometries']:
+            r, l = _parts(g)
+            rings, lines = rings + r, lines + l
+        return rings, lines
+    c = geometry['coordinates']
+    if t == 'Polygon':
+        return c, []
+    if t == 'MultiPolygon':
+        return [ring for polygon in c for ring in polygon], []
+    if t == 'LineString':
+        return [], [c]
+    if t == 'MultiLineString':
+        return [], c
+    if t == 'Point':
+        return [], [[c]]
+    return [], [[p] for p in c]
+
+
+def _segments(line):
+    if len(line) == 1:
+        # a point
+        return [(line[0][0], line[0][1], line[0][0], line[0][1])]
+    return [(line[i][0], line[i][1], line[i + 1][0], line[i + 1][1]) for i in range(len(line) - 1)]
+
+
+def _on_segment(p, q, r):
+    """ Is q on segment pr, given they are collinear """
+    return min(p[0], r[0]) <= q[0] <= max(p[0], r[0]) and min(p[1], r[1]) <= q[1] <= max(p[1], r[1])
+
+
+def _orientation(p, q, r):
+    val = _cross(p, q, r)
+    return 0 if val == 0 else (1 if val > 0 else 2)
+
+
+def segments_intersect(s1, s2):
+    """ Do two segments (x1, y1, x2, y2) intersect, including touching """
+    p1, q1, p2, q2 = s1[0:2], s1[2:4], s2[0:2], s2[2:4]
+    o1, o2, o3, o4 = _orientation(p1, q1, p2), _orientation(p1, q1, q2), _orientation(p2, q2, p1), _orientation(p2, q2, q1)
+    if o1 != o2 and o3 != o4:
+        return True
+    return ((o1 == 0 and _on_segment(p1, p2, q1)) or (o2 == 0 and _on_segment(p1, q2, q1)) or
+            (o3 == 0 and _on_segment(p2, p1, q2)) or (o4 == 0 and _on_segment(p2, q1, q2)))
+
+
+class Shape(object):
+    """ A GeoJSON geometry prepared for testing which geometries intersect it
+
+    Segments are bucketed in a grid over the bounding box so that each test only looks at
+    the nearby part of a large geometry, and whether a point is inside it is determined by
+    ray casting across the segments in the point's row of the grid.
+    """
+
+    def __init__(self, geometry, grid=64):
+        self.geometry = geometry
+        self.bbox = envelope(geometry)
+        rings, lines = _parts(geometry)
+        self.polygonal = len(rings) > 0
+        self.segments = [s for r in rings + lines for s in _segments(r)]
+        # a point of each ring or line, to check containment when no segments intersect
+        self.vertices = [part[0] for part in rings + lines if len(part) > 0]
+        self.n = grid
+        minx, miny, maxx, maxy = self.bbox
+        self.dx = (maxx - minx) / grid or 1.0
+        self.dy = (maxy - miny) / grid or 1.0
+        self.cells = {}
+        self.rows = [[] for i in range(grid)]
+        for i, s in enumerate(self.segments):
+            c0, r0 = self._cell(min(s[0], s[2]), min(s[1], s[3]))
+            c1, r1 = self._cell(max(s[0], s[2]), max(s[1], s[3]))
+            for r in range(r0, r1 + 1):
+                self.rows[r].append(i)
+                for c in range(c0, c1 + 1):
+                    self.cells.setdefault((c, r), []).append(i)
+
+    def _cell(self, x, y):
+        """ Column and row of the grid cell containing a point (clamped to the grid) """
+        c = int((x - self.bbox[0]) / self.dx)
+        r = int((y - self.bbox[1]) / self.dy)
+        return min(max(c, 0), self.n - 1), min(max(r, 0), self.n - 1)
+
+    def _nearby(self, bbox):
+        """ Indices of segments in grid cells overlapping bbox """
+        c0, r0 = self._cell(bbox[0], bbox[1])
+        c1, r1 = self._cell(bbox[2], bbox[3])
+        found = set()
+        for r in range(r0, r1 + 1):
+            for c in range(c0, c1 + 1):
+                found.update(self.cells.get((c, r), []))
+        return found
+
+    def contains_point(self, p):
+        """ Is a point inside (or on the boundary of) this Polygon or MultiPolygon """
+        if not self.polygonal:
+            return False
+        x, y = p[0], p[1]
+        if not (self.bbox[0] <= x <= self.bbox[2] and self.bbox[1] <= y <= self.bbox[3]):
+            return False
+        inside = False
+        for i in self.rows[self._cell(x, y)[1]]:
+            x1, y1, x2, y2 = self.segments[i]
+            if _orientation((x1, y1), (x2, y2), (x, y)) == 0 and _on_segment((x1, y1), (x, y), (x2, y2)):
+                return True
+            if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+                inside = not inside
+        return inside
+
+    def intersects(self, geometry):
+        """ Does a GeoJSON geometry intersect this one """
+        if geometry is None:
+            return False
+        other = Shape(geometry, grid=1)
+        b = other.bbox
+        if b[0] > self.bbox[2] or b[2] < self.bbox[0] or b[1] > self.bbox[3] or b[3] < self.bbox[1]:
+            return False
+        nearby = [self.segments[i] for i in self._nearby(b)]
+        for s1 in other.segments:
+            for s2 in nearby:
+                if segments_intersect(s1, s2):
+                    return True
+        # without crossing boundaries, one is inside the other or they are apart
+        for p in other.vertices:
+            if self.contains_point(p):
+                return True
+        for p in self.vertices:
+            if b[0] <= p[0] <= b[2] and b[1] <= p[1] <= b[3] and other.contains_point(p):
+                return True
+        return False
@@ -0,0 +1,99 @@
+import copy
+import json
+import logging
+import os
+
+from dateutil.parser import parse as dateparse
+from satstac import ItemCollection
+from satstac.utils import dict_merge
+from satsearch.geojson import ItemWriter, open_file
+from satsearch.search import Search
+
+logger = logging.getLogger(__name__)
+
+
+def read_watermark(filename):
+    """ Read the watermark from a state file, or None if there is no state file """
+    if not os.path.exists(filename):
+        return None
+    with open_file(filename, 'r') as f:
+        data = json.loads(f.read())
+    return data.get('properties', {}).get('watermark', None)
+
+
+def narrow(kwargs, watermark, field='datetime'):
+    """ Narrow search parameters to Items at or after the watermark, oldest first
+
+    Items are sorted on the watermark field so that, if there are more new Items than the
+    limit, the ones returned are the oldest and the rest are found by the next run
+    """
+    kwargs = dict(kwargs)
+    if watermark is not None:
+        field = watermark['field']
+    kwargs['sortby'] = ['properties.%s' % field]
+    if watermark is None:
+        return kwargs
+    value = watermark['value']
+    if watermark['field'] == 'datetime':
+        dt = kwargs.get('datetime', None)
+        if dt is None:
+            kwargs['datetime'] = '%s/..' % value
+        elif '/' in dt:
+            start, end = dt.split('/')
+            if start in ('', '..') or dateparse(start, ignoretz=True) < dateparse(value, ignoretz=True):
+                start = value
+            kwargs['datetime'] = '%s/%s' % (start, end)
+    elif isinstance(kwargs.get('query', None), list):
+        kwargs['query'] = kwargs['query'] + ['%s>=%s' % (watermark['field'], value)]
+    else:
+        query = copy.deepcopy(kwargs.get('query', None) or {})
+        kwargs['query'] = dict_merge(query, {watermark['field']: {'gte': value}})
+    return kwargs
+
+
+def _value(item, field):
+    """ Value of the watermark field for an Item, parsed to a datetime """
+    value = item.properties.get(field, None)
+    return None if value is None else dateparse(value, ignoretz=True)
+
+
+def incremental_items(state, field='datetime', headers=None, **kwargs):
+    """ Return only the Items not seen in previous runs of this search
+
+    The watermark, the latest value of `field` (datetime or another datetime property such as
+    updated) seen and the ids of the Items with that value, is saved in the `state` file. Each
+    run narrows the search to Items at or after the watermark, then saves the new Items along
+    with the updated watermark back to the state file, a FeatureCollection that can be loaded
+    like any saved search results.
+    """
+    watermark = read_watermark(state)
+    if watermark is not None and watermark['field'] != field:
+        logger.warning('Watermark in %s is on %s, not %s' % (state, watermark['field'], field))
+        field = watermark['field']
+    search = Search.search(headers=headers, **narrow(kwargs, watermark, field=field))
+
+    wm_value = None if watermark is None else dateparse(watermark['value'], ignoretz=True)
+    wm_ids = set([] if watermark is None else watermark['ids'])
+    latest, latest_ids = wm_value, set(wm_ids)
+    items = []
+    for item in search.items(headers=headers, stream=True):
+        value = _value(item, field)
+        if value is not None and wm_value is not None:
+            if value < wm_value or (value == wm_value and item.id in wm_ids):
+                continue
+        items.append(item)
+        if value is None:
+            continue
+        if latest is None or value > latest:
+            latest, latest_ids = value, set([item.id])
+            watermark = {'field': field, 'value': item.properties[field], 'ids': []}
+        elif value == latest:
+            latest_ids.add(item.id)
+    if watermark is not None:
+        watermark['ids'] = sorted(latest_ids)
+    logger.info('%s new items since %s' % (len(items), 'first run' if wm_value is None else wm_value))
+
+    with ItemWriter(state, properties={'watermark': watermark}) as writer:
+        for item in items:
+            writer.write(item)
+    return ItemCollection(items, collections=list(writer.collections.values()))
@@ -0,0 +1,239 @@
+import logging
+import os
+import sqlite3
+import threading
+
+from datetime import datetime, timedelta, timezone
+from dateutil.parser import parse as dateparse
+from dateutil.relativedelta import relativedelta
+from satstac import Collection, Item, ItemCollection
+from satsearch import fastjson
+from satsearch.geometry import Shape, envelope
+from satsearch.search import SatSearchError
+
+logger = logging.getLogger(__name__)
+
+# SQL for STAC query operators
+QUERY_OPS = {
+    'eq': '=',
+    'neq': '=',
+    'lt': '<',
+    'lte': '<=',
+    'gt': '>',
+    'gte': '>=',
+    'in': 'IN'
+}
+
+# length of partial dates (YYYY, YYYY-MM, YYYY-MM-DD) and the period they cover
+PERIODS = {
+    4: relativedelta(years=1),
+    7: relativedelta(months=1),
+    10: relativedelta(days=1)
+}
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS items '
+    '(rowid INTEGER PRIMARY KEY, id TEXT UNIQUE, collection TEXT, datetime TEXT, item TEXT)',
+    'CREATE INDEX IF NOT EXISTS items_collection ON items (collection)',
+    'CREATE INDEX IF NOT EXISTS items_datetime ON items (datetime)',
+    'CREATE VIRTUAL TABLE IF NOT EXISTS items_bbox USING rtree(id, minx, maxx, miny, maxy)',
+    'CREATE TABLE IF NOT EXISTS properties (itemid INTEGER, key TEXT, num REAL, text TEXT)',
+    'CREATE INDEX IF NOT EXISTS properties_itemid ON properties (itemid)',
+    'CREATE INDEX IF NOT EXISTS properties_num ON properties (key, num)',
+    'CREATE INDEX IF NOT EXISTS properties_text ON properties (key, text)',
+    'CREATE TABLE IF NOT EXISTS collections (id TEXT PRIMARY KEY, collection TEXT)'
+]
+
+
+def timestamp(value, end=False):
+    """ Normalize a datetime string to UTC for comparison, a partial date is the start (or end) of that period """
+    try:
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        dt = dateparse(value, default=datetime(2000, 1, 1))
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    if end and len(value) in PERIODS:
+        dt = dt + PERIODS[len(value)] - timedelta(microseconds=1)
+    return dt.strftime('%Y-%m-%dT%H:%M:%S.%f')
+
+
+class Index(object):
+    """ Local index of Items in a SQLite database, for searching saved results offline
+
+    Item bboxes are kept in an R-tree, and datetime, collection and all scalar properties are
+    indexed, so that the same filters as a search (ids, collections, bbox, intersects,
+    datetime, query and sortby) can be answered without the API. Items with an id already in
+    the index replace the existing Item.
+    """
+
+    def __init__(self, path=':memory:'):
+        if path != ':memory:' and os.path.dirname(path) != '' and not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self.db:
+            for sql in SCHEMA:
+                self.db.execute(sql)
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+
+    def close(self):
+        """ Close the database """
+        self.db.close()
+
+    def add(self, items, collections=[]):
+        """ Add Items (and Collections) to the index, returning the number of Items added """
+        count = 0
+        with self.lock, self.db:
+            for c in collections:
+                self._add_collection(c)
+            for item in items:
+                if item._collection is not None:
+                    self._add_collection(item._collection)
+                self._add_item(item)
+                count += 1
+        logger.debug('Added %s items to index %s' % (count, self.path))
+        return count
+
+    def feed(self, items, batch_size=500):
+        """ Yield Items, adding them to the index in batches as they are iterated over """
+        batch = []
+        for item in items:
+            batch.append(item)
+            yield item
+            if len(batch) >= batch_size:
+                self.add(batch)
+                batch = []
+        self.add(batch)
+
+    def _add_collection(self, collection):
+        self.db.execute('INSERT OR REPLACE INTO collections VALUES (?, ?)',
+                        (collection.id, fastjson.dumps(collection._data)))
+
+    def _add_item(self, item):
+        self._remove(item.id)
+        props = item.properties
+        dt = props.get('datetime', None) or props.get('start_datetime', None)
+        rowid = self.db.execute('INSERT INTO items (id, collection, datetime, item) VALUES (?, ?, ?, ?)',
+                                (item.id, item._data.get('collection', props.get('collection', None)),
+                                 None if dt is None else timestamp(dt), fastjson.dumps(item._data))).lastrowid
+        bbox = item._data.get('bbox', None)
+        if bbox is None and item._data.get('geometry', None) is not None:
+            bbox = envelope(item._data['geometry'])
+        if bbox is not None:
+            # 2D or 3D bbox
+            n = len(bbox) // 2
+            self.db.execute('INSERT INTO items_bbox VALUES (?, ?, ?, ?, ?)',
+                            (rowid, bbox[0], bbox[n], bbox[1], bbox[n + 1]))
+        values = []
+        for key, value in props.items():
+            if isinstance(value, (bool, int, float)):
+                values.append((rowid, key, float(value), None))
+            elif isinstance(value, str):
+                values.append((rowid, key, None, value))
+        self.db.executemany('INSERT INTO properties VALUES (?, ?, ?, ?)', values)
+
+    def _remove(self, id):
+        row = self.db.execute('SELECT rowid FROM items WHERE id = ?', (id,)).fetchone()
+        if row is not None:
+            for sql in ['DELETE FROM items WHERE rowid = ?', 'DELETE FROM items_bbox WHERE id = ?',
+                        'DELETE FROM properties WHERE itemid = ?']:
+                self.db.execute(sql, row)
+
+    @staticmethod
+    def _property_filter(key, op, value):
+        """ SQL condition and parameters for one STAC query operator on a property """
+        if op not in QUERY_OPS:
+            raise SatSearchError('Unsupported query operator %s' % op)
+        values = value if op == 'in' else [value]
+        try:
+            column, values = 'num', [float(v) for v in values]
+        except (TypeError, ValueError):
+            column, values = 'text', [str(v) for v in values]
+        if op == 'in':
+            condition = '%s IN (%s)' % (column, ','.join('?' * len(values)))
+        else:
+            condition = '%s %s ?' % (column, QUERY_OPS[op])
+        sql = 'rowid %s (SELECT itemid FROM properties WHERE key = ? AND %s)' % \
+              ('NOT IN' if op == 'neq' else 'IN', condition)
+        return sql, [key] + values
+
+    @staticmethod
+    def _sort_column(field):
+        """ SQL expression for a sortby field """
+        if field in ('datetime', 'properties.datetime'):
+            return 'datetime', []
+        keys = field.split('.')
+        if len(keys) == 1 and field not in ('id', 'collection'):
+            keys = ['properties'] + keys
+        return 'json_extract(item, ?)', ['$' + ''.join('."%s"' % k for k in keys)]
+
+    def search(self, ids=None, collections=None, bbox=None, intersects=None, datetime=None, query=None,
+               sortby=None, limit=None):
+        """ Return the Items (and their Collections) in the index matching the search parameters
+
+        Parameters are the same as for a STAC API search, with query and sortby in STAC form (see
+        `satsearch.search.parse_query` and `parse_sortby`). If ids are given the other filters
+        are ignored.
+        """
+        where, params = [], []
+        if ids:
+            # as with the API, ids ignore other parameters
+            collections = bbox = intersects = datetime = query = None
+        for column, values in [('id', ids), ('collection', collections)]:
+            if values:
+                where.append('%s IN (%s)' % (column, ','.join('?' * len(values))))
+                params += list(values)
+        boxes = [] if bbox is None else [[float(b) for b in bbox]]
+        if intersects is not None:
+            boxes.append(envelope(intersects))
+        for b in boxes:
+            where.append('rowid IN (SELECT id FROM items_bbox WHERE minx <= ? AND maxx >= ? AND miny <= ? AND maxy >= ?)')
+            params += [b[2], b[0], b[3], b[1]]
+        if datetime is not None:
+            parts = datetime.split('/')
+            start, end = (parts[0], parts[0]) if len(parts) == 1 else parts
+            if start not in ('', '..'):
+                where.append('datetime >= ?')
+                params.append(timestamp(start))
+            if end not in ('', '..'):
+                where.append('datetime <= ?')
+                params.append(timestamp(end, end=True))
+        for key, ops in (query or {}).items():
+            if not isinstance(ops, dict):
+                ops = {'eq': ops}
+            for op, value in ops.items():
+                sql, _params = self._property_filter(key, op, value)
+                where.append(sql)
+                params += _params
+        sql = 'SELECT item FROM items'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        orders = []
+        for sort in (sortby or []):
+            column, _params = self._sort_column(sort['field'])
+            orders.append(column + (' DESC' if sort.get('direction') == 'desc' else ''))
+            params += _params
+        sql += ' ORDER BY ' + ', '.join(orders + ['rowid'])
+        # Items within the bbox of intersects are checked against the geometry after
+        if limit is not None and intersects is None:
+            sql += ' LIMIT %s' % int(limit)
+        shape = None if intersects is None else Shape(intersects)
+
+        with self.lock:
+            items = []
+            for row in self.db.execute(sql, params):
+                item = Item(fastjson.loads(row[0]))
+                if shape is None or shape.intersects(item._data.get('geometry', None)):
+                    items.append(item)
+                if limit is not None and len(items) >= int(limit):
+                    break
+            cids = sorted(set([i._data['collection'] for i in items if 'collection' in i._data]))
+            rows = self.db.execute('SELECT collection FROM collections WHERE id IN (%s)' % ','.join('?' * len(cids)),
+                                   cids).fetchall()
+        logger.debug('%s items found in index %s' % (len(items), self.path))
+        return ItemCollection(items, collections=[Collection(fastjson.loads(row[0])) for row in rows])
@@ -0,0 +1,73 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PageSizer(object):
+    """ Chooses the number of Items to request for each page from how previous pages went
+
+    The page size grows (at most doubling each page) while responses take less than `target`
+    seconds, and shrinks in proportion when they take longer. Pages are kept under `max_bytes`
+    going by the size of Items so far, and halved after a request times out or fails with a
+    5xx error. If the API returns fewer Items than requested on a page that isn't the last,
+    that is taken to be the most it returns per page. The size always stays between min_size
+    and max_size, so it is fixed if they are equal.
+    """
+
+    def __init__(self, size=None, min_size=10, max_size=10000, target=2.0, max_bytes=50e6):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target = target
+        self.max_bytes = max_bytes
+        # most Items per page the API has been seen to return
+        self.server_max = None
+        self.size = None if size is None else self._clamp(size)
+
+    def __repr__(self):
+        return 'PageSizer(size=%s, min_size=%s, max_size=%s)' % (self.size, self.min_size, self.max_size)
+
+    def copy(self):
+        """ New PageSizer with the same bounds, starting from the current size, for another search """
+        sizer = PageSizer(size=self.size, min_size=self.min_size, max_size=self.max_size, target=self.target,
+                          max_bytes=self.max_bytes)
+        sizer.server_max = self.server_max
+        return sizer
+
+    @property
+    def adaptive(self):
+        return self.min_size < self.max_size
+
+    def _clamp(self, size):
+        if self.server_max is not None:
+            size = min(size, self.server_max)
+        return int(max(self.min_size, min(size, self.max_size)))
+
+    def start(self, size):
+        """ Page size to start with, `size` unless already set """
+        if self.size is None:
+            self.size = self._clamp(size)
+        return self.size
+
+    def update(self, requested, returned, nbytes, elapsed, last=False):
+        """ Adjust the page size after a page of `returned` Items (of `requested`) is received """
+        if not last and 0 < returned < requested and self.server_max != returned:
+            logger.info('API returns at most %s Items per page' % returned)
+            self.server_max = returned
+        if not self.adaptive or returned == 0:
+            self.size = self._clamp(self.size)
+            return self.size
+        size = self.size * 2
+        if elapsed > 0:
+            size = min(size, returned * self.target / elapsed)
+        if nbytes > 0:
+            size = min(size, returned * self.max_bytes / nbytes)
+        self.size = self._clamp(size)
+        logger.debug('Page of %s Items in %.3f seconds, next page size %s' % (returned, elapsed, self.size))
+        return self.size
+
+    def failed(self):
+        """ Halve the page size after a failed request, returning False if it can't be made smaller """
+        if not self.adaptive or self.size <= self.min_size:
+            return False
+        self.size = self._clamp(self.size // 2)
+        return True
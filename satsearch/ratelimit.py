@@ -0,0 +1,105 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter(object):
+    """ Token bucket limiting requests to `rate` per second on average, in bursts of up to `burst`
+
+    Requests wait in acquire() until a token is available. pause() stops all requests for a
+    time, e.g. when the API responds 429 (Too Many Requests) with a Retry-After header. The
+    bucket is shared by the threads using this object, see `SQLiteRateLimiter` for one shared
+    between processes.
+    """
+
+    def __init__(self, rate, burst=1):
+        if rate <= 0:
+            raise ValueError('Rate must be positive')
+        self.rate = float(rate)
+        self.burst = max(1, burst)
+        self.lock = threading.Lock()
+        self._tokens, self._updated = float(self.burst), time.time()
+        # seconds spent waiting, and number of pauses
+        self.waited = 0.0
+        self.pauses = 0
+
+    def __str__(self):
+        return 'Rate limit: %s/s (burst %s), waited %.1f seconds, %s pauses' % \
+               (self.rate, self.burst, self.waited, self.pauses)
+
+    def _transact(self, func):
+        """ Update the bucket with func(tokens, updated, now), returning (tokens, updated, result) """
+        with self.lock:
+            self._tokens, self._updated, result = func(self._tokens, self._updated, time.time())
+        return result
+
+    def _reserve(self, tokens, updated, now):
+        """ Take a token, returning the new bucket and the seconds until it can be used """
+        if now > updated:
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            updated = now
+        tokens -= 1
+        return tokens, updated, (updated - now) + max(0.0, -tokens / self.rate)
+
+    @staticmethod
+    def _pause(seconds):
+        def pause(tokens, updated, now):
+            # tokens accrue again from the end of the pause, with one ready then
+            if now + seconds > updated:
+                return min(tokens, 1.0), now + seconds, None
+            return tokens, updated, None
+        return pause
+
+    def acquire(self):
+        """ Wait until a request can be made, returning the seconds waited """
+        wait = self._transact(self._reserve)
+        if wait > 0:
+            self.waited += wait
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds):
+        """ Make no requests for the given number of seconds """
+        logger.info('Pausing requests for %.1f seconds' % seconds)
+        self.pauses += 1
+        self._transact(self._pause(seconds))
+
+
+class SQLiteRateLimiter(RateLimiter):
+    """ Token bucket kept in a SQLite database, shared by all processes using the same file
+
+    Each `name` (e.g., the API host) is a separate bucket
+    """
+
+    def __init__(self, path, rate, burst=1, name='default'):
+        super(SQLiteRateLimiter, self).__init__(rate, burst=burst)
+        if os.path.dirname(path) != '' and not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        self.path = path
+        self.name = name
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.db.execute('CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL, updated REAL)')
+
+    @classmethod
+    def open(cls, directory, rate, **kwargs):
+        """ Open the rate limit database in directory """
+        return cls(os.path.join(directory, 'sat-search-ratelimit.sqlite'), rate, **kwargs)
+
+    def _transact(self, func):
+        with self.lock:
+            # lock the database for writing while the bucket is read and updated
+            self.db.execute('BEGIN IMMEDIATE')
+            try:
+                row = self.db.execute('SELECT tokens, updated FROM buckets WHERE name = ?', (self.name,)).fetchone()
+                tokens, updated = (float(self.burst), time.time()) if row is None else row
+                tokens, updated, result = func(tokens, updated, time.time())
+                self.db.execute('INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)', (self.name, tokens, updated))
+                self.db.execute('COMMIT')
+            except Exception:
+                self.db.execute('ROLLBACK')
+                raise
+        return result
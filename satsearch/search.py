@@ -2,16 +2,103 @@ import json
 import os
 import logging
 import requests
+import threading
+import time
 
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from satstac import Collection, Item, ItemCollection
 from satstac.utils import dict_merge
+from satsearch import fastjson
+from satsearch.geojson import LazyItemCollection
+from satsearch.geometry import Shape, simplify
+from satsearch.paging import PageSizer
 from urllib.parse import urljoin
 
 logger = logging.getLogger(__name__)
 
 
 class SatSearchError(Exception):
-    pass
+    def __init__(self, message, status=None):
+        super(SatSearchError, self).__init__(message)
+        # HTTP status code of an API error
+        self.status = status
+
+
+def split_datetime(dt, n):
+    """ Split a datetime interval (e.g., 2017-01-01/2017-02-15) into n adjacent intervals
+
+    A partial date (e.g., 2017 or 2017-02) starts the interval at the start of that period, or
+    ends it at the end of that period
+    """
+    from satsearch.index import PERIODS, timestamp
+    parts = dt.split('/')
+    if n < 2 or len(parts) != 2 or '..' in parts or '' in parts:
+        return [dt]
+    start = datetime.fromisoformat(timestamp(parts[0]))
+    # exclusive end, so that whole periods split evenly
+    end = datetime.fromisoformat(timestamp(parts[1], end=True)) + timedelta(microseconds=1)
+    step = (end - start) / n
+    # keep the original start, and make a partial end explicit as an API may take it as the start of its period
+    last = timestamp(parts[1], end=True) + 'Z' if len(parts[1]) in PERIODS else parts[1]
+    edges = [parts[0]] + [(start + step * i).strftime('%Y-%m-%dT%H:%M:%SZ') for i in range(1, n)] + [last]
+    return ['%s/%s' % (edges[i], edges[i+1]) for i in range(n)]
+
+
+def split_bbox(bbox, n):
+    """ Split a bounding box into an n x n grid of tiles """
+    minx, miny, maxx, maxy = [float(b) for b in bbox]
+    dx, dy = (maxx - minx) / n, (maxy - miny) / n
+    return [[minx + dx * i, miny + dy * j, minx + dx * (i + 1), miny + dy * (j + 1)]
+            for j in range(n) for i in range(n)]
+
+
+def sort_items(items, sortby):
+    """ Sort Items by a list of STAC sortby fields (e.g., [{'field': 'properties.datetime', 'direction': 'desc'}]) """
+    def value(item, field):
+        val = item._data
+        for key in field.split('.'):
+            val = val.get(key, None) if isinstance(val, dict) else None
+        if val is None:
+            val = item.properties.get(field, None)
+        return (val is not None, val)
+    for sort in reversed(sortby):
+        items = sorted(items, key=lambda i: value(i, sort['field']), reverse=sort.get('direction') == 'desc')
+    return items
+
+
+def parse_query(query):
+    """ Convert a list of KEY=VALUE strings (<, >, <=, >=, = supported) to a STAC query """
+    queries = {}
+    for q in query:
+        for s in Search.search_op_list:
+            parts = q.split(s)
+            if len(parts) == 2:
+                queries = dict_merge(queries, {parts[0]: {Search.search_op_to_stac_op[s]: parts[1]}})
+                break
+    return queries
+
+
+def parse_sortby(sortby):
+    """ Convert a list of fields, prefixed with - for descending order, to STAC sortby fields """
+    directions = {'-': 'desc', '+': 'asc'}
+    sorts = []
+    for a in sortby:
+        if a[0] not in directions:
+            a = '+' + a
+        sorts.append({
+            'field': a[1:],
+            'direction': directions[a[0]]
+        })
+    return sorts
+
+
+def parse_fields(fields):
+    """ Convert a list of fields, prefixed with - to exclude them, to a STAC fields object """
+    return {
+        'include': [f.lstrip('+') for f in fields if not f.startswith('-')],
+        'exclude': [f[1:] for f in fields if f.startswith('-')]
+    }
 
 
 class Search(object):
@@ -19,49 +106,84 @@ class Search(object):
     search_op_list = ['>=', '<=', '=', '>', '<']
     search_op_to_stac_op = {'>=': 'gte', '<=': 'lte', '=': 'eq', '>': 'gt', '<': 'lt'}
 
-    def __init__(self, url=os.getenv('STAC_API_URL', None), **kwargs):
-        """ Initialize a Search object with parameters """
+    def __init__(self, url=os.getenv('STAC_API_URL', None), session=None, cache=None, hooks=None, envelope=None,
+                 page_sizer=None, **kwargs):
+        """ Initialize a Search object with parameters
+
+        A shared `satsearch.session.Session` (or any requests Session) can be passed in to
+        reuse pooled connections and retry failed requests, otherwise one-off requests are made.
+        Responses are cached in `cache` (see `satsearch.cache`) if provided.
+
+        Each of `hooks` is called as hook(event, **info) for the events 'request' (url, status,
+        nbytes, elapsed, decode, cached), 'page' (nitems), 'items' (nitems, elapsed) and
+        'collection' (id, elapsed), see `satsearch.stats.Stats`
+
+        With an `envelope` ('bbox' or 'hull') the API is sent that envelope of the intersects
+        geometry rather than the geometry itself, and Items returned are then checked against
+        the geometry, giving the same Items with smaller requests. found() counts the Items
+        intersecting the envelope.
+
+        Pages are all the requested size (page_limit) unless a `satsearch.paging.PageSizer` is
+        given as `page_sizer`, which adapts the page size to how quickly the API responds.
+
+        A `fields` parameter (the STAC fields extension, {'include': [...], 'exclude': [...]},
+        see `parse_fields`) limits the parts of each Item returned. If the API rejects it the
+        search is made again for complete Items.
+        """
         if url is None:
             raise SatSearchError("URL not provided, pass into Search or define STAC_API_URL environment variable")
         self.url = url.rstrip("/") + "/"
+        self.session = requests if session is None else session
+        self.cache = cache
+        self.hooks = hooks or []
+        self.page_sizer = page_sizer
         self.kwargs = kwargs
         self.limit = int(self.kwargs['limit']) if 'limit' in self.kwargs else None
+        # the exact AOI, if the API is sent an envelope of it
+        self.aoi = None
+        if envelope is not None and self.kwargs.get('intersects', None) is not None:
+            self.aoi = Shape(self.kwargs['intersects'])
+            self.kwargs['intersects'] = simplify(self.kwargs['intersects'], envelope)
+            fields = self.kwargs.get('fields', None)
+            if fields:
+                # geometries are needed to check Items against the AOI
+                include = fields.get('include', None) or []
+                self.kwargs['fields'] = {
+                    'include': include + ['geometry'] if include and 'geometry' not in include else include,
+                    'exclude': [f for f in fields.get('exclude', None) or [] if f != 'geometry']
+                }
+        # Collection records retrieved so far, by id, and a lock so each is only fetched once
+        self._collections = {}
+        self._collections_lock = threading.Lock()
+        # ids not found by items_by_id
+        self.missing_ids = []
 
     @classmethod
     def search(cls, headers=None, **kwargs):
         if 'query' in kwargs and isinstance(kwargs['query'], list):
-            queries = {}
-            for q in kwargs['query']:
-                for s in Search.search_op_list:
-                    parts = q.split(s)
-                    if len(parts) == 2:
-                        queries = dict_merge(queries, {parts[0]: {Search.search_op_to_stac_op[s]: parts[1]}})
-                        break
-            kwargs['query'] = queries
-        directions = {'-': 'desc', '+': 'asc'}
+            kwargs['query'] = parse_query(kwargs['query'])
         if 'sortby' in kwargs and isinstance(kwargs['sortby'], list):
-            sorts = []
-            for a in kwargs['sortby']:
-                if a[0] not in directions:
-                    a = '+' + a
-                sorts.append({
-                    'field': a[1:],
-                    'direction': directions[a[0]]
-                })
-            kwargs['sortby'] = sorts
-        return Search(**kwargs)
+            kwargs['sortby'] = parse_sortby(kwargs['sortby'])
+        if 'fields' in kwargs and isinstance(kwargs['fields'], list):
+            kwargs['fields'] = parse_fields(kwargs['fields'])
+        return cls(**kwargs)
 
     def found(self, headers=None):
         """ Small query to determine total number of hits """
-        kwargs = {
-            'limit': 0
-        }
-        kwargs.update(self.kwargs)
+        kwargs = dict(self.kwargs)
+        kwargs['limit'] = 0
+        kwargs.pop('fields', None)
         url = urljoin(self.url, 'search')
         
         results = self.query(url=url, headers=headers, **kwargs)
         # TODO - check for status_code
-        logger.debug(f"Found: {json.dumps(results)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Found: {json.dumps(results)}")
+        return self._found(results)
+
+    @staticmethod
+    def _found(results):
+        """ Number of hits reported in a page of results """
         found = 0
         if 'context' in results:
             found = results['context']['matched']
@@ -69,30 +191,55 @@ class Search(object):
             found = results['numberMatched']
         return found
 
+    def _emit(self, event, **info):
+        """ Call hooks with an event """
+        for hook in self.hooks:
+            hook(event, **info)
+
     def query(self, url=None, headers=None, **kwargs):
         """ Get request """
+        return self._request(url=url, headers=headers, **kwargs)[0]
+
+    def _request(self, url=None, headers=None, method='POST', **kwargs):
+        """ Make a request, returning the decoded response, its size in bytes, and seconds taken """
         url = url or urljoin(self.url, 'search')
-        logger.debug('Query URL: %s, Body: %s' % (url, json.dumps(kwargs)))
-        response = requests.post(url, json=kwargs, headers=headers)
-        logger.debug(f"Response: {response.text}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Query URL: %s, Body: %s' % (url, json.dumps(kwargs)))
+        start = time.perf_counter()
+        content = None if self.cache is None else self.cache.get(url, body=kwargs, headers=headers)
+        cached, status = content is not None, 200
+        if not cached:
+            if method == 'GET':
+                response = self.session.get(url, headers=headers)
+            else:
+                response = self.session.post(url, json=kwargs, headers=headers)
+            content, status = response.content, response.status_code
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Response: {response.text}")
+        elapsed = time.perf_counter() - start
         # API error
-        if response.status_code != 200:
-            raise SatSearchError(response.text)
-        return response.json()
+        if status != 200:
+            self._emit('request', url=url, status=status, nbytes=len(content), elapsed=elapsed, decode=0, cached=cached)
+            raise SatSearchError(response.text, status=status)
+        if self.cache is not None and not cached:
+            self.cache.set(url, content, body=kwargs, headers=headers)
+        start = time.perf_counter()
+        data = fastjson.loads(content)
+        self._emit('request', url=url, status=status, nbytes=len(content), elapsed=elapsed,
+                   decode=time.perf_counter() - start, cached=cached)
+        return data, len(content), elapsed
 
     def collection(self, cid, headers=None):
         """ Get a Collection record """
         url = urljoin(self.url, 'collections/%s' % cid)
-        return Collection(self.query(url=url, headers=headers))
+        start = time.perf_counter()
+        collection = Collection(self.query(url=url, headers=headers))
+        self._emit('collection', id=cid, elapsed=time.perf_counter() - start)
+        return collection
 
-    def items(self, limit=10000, page_limit=500, headers=None):
-        """ Return all of the Items and Collections for this search """
-        found = self.found(headers=headers)
-        limit = self.limit or limit
-        if found > limit:
-            logger.warning('There are more items found (%s) than the limit (%s) provided.' % (found, limit))
-
-        nextlink = {
+    def _first_link(self, headers=None):
+        """ Link to the first page of results """
+        return {
             'method': 'POST',
             'href': urljoin(self.url, 'search'),
             'headers': headers,
@@ -100,31 +247,253 @@ class Search(object):
             'merge': False
         }
 
-        items = []
-        while nextlink and len(items) < limit:
-            if nextlink.get('method', 'GET') == 'GET':
-                resp = self.query(url=nextlink['href'], headers=headers, **self.kwargs)
+    def _link_request(self, nextlink, page_limit=500, headers=None):
+        """ URL and body of the request for a (next) link """
+        if nextlink.get('method', 'GET') == 'GET':
+            return nextlink['href'], dict(self.kwargs, limit=page_limit)
+        _headers = nextlink.get('headers', None) or {}
+        _body = dict(nextlink.get('body', {}))
+        
+        if nextlink.get('merge', False):
+            _headers.update(headers or {})
+            _body.update(self.kwargs)
+        # the limit of this search is the total number of Items, not the page size
+        _body['limit'] = page_limit
+        return nextlink['href'], _body
+
+    @staticmethod
+    def _next_link(resp):
+        """ Next link of a page of results, if any """
+        links = [l for l in resp['links'] if l['rel'] == 'next']
+        return links[0] if len(links) == 1 else None
+
+    def _page_received(self, resp, count, limit):
+        """ Trim a page of results to the AOI and limit, returning the number of Items received so far """
+        if self.aoi is not None:
+            resp['features'] = [f for f in resp['features'] if self.aoi.intersects(f.get('geometry', None))]
+        if count == 0:
+            found = self._found(resp)
+            if found > limit:
+                logger.warning('There are more items found (%s) than the limit (%s) provided.' % (found, limit))
+        resp['features'] = resp['features'][:limit - count]
+        return count + len(resp['features'])
+
+    def pages(self, limit=10000, page_limit=500, headers=None):
+        """ Iterate through the pages of results for this search, following next links
+
+        Pages are requested with no more Items than needed to reach the limit, and the last page
+        is trimmed to it if the API returns more. With a `page_sizer`, page_limit is the size of
+        the first page, and a page that fails with a timeout or 5xx error is requested again
+        with fewer Items
+        """
+        limit = self.limit or limit
+        sizer = self.page_sizer or PageSizer(min_size=page_limit, max_size=page_limit)
+        sizer.start(page_limit)
+        nextlink = self._first_link(headers=headers)
+        count = 0
+        while nextlink and count < limit:
+            requested = min(sizer.size, limit - count)
+            url, body = self._link_request(nextlink, page_limit=requested, headers=headers)
+            try:
+                resp, nbytes, elapsed = self._request(url=url, headers=headers, **body)
+            except (SatSearchError, requests.exceptions.Timeout, requests.exceptions.ConnectionError) as err:
+                if isinstance(err, SatSearchError) and err.status == 400 and 'fields' in self.kwargs:
+                    # the API may not support the fields extension
+                    logger.warning('Search with fields failed, requesting complete Items: %s' % err)
+                    del self.kwargs['fields']
+                    continue
+                if (isinstance(err, SatSearchError) and (err.status or 0) < 500) or not sizer.failed():
+                    raise
+                logger.warning('Request for %s Items failed, requesting %s: %s' % (requested, sizer.size, err))
+                continue
+            returned = len(resp['features'])
+            count = self._page_received(resp, count, limit)
+            self._emit('page', nitems=len(resp['features']))
+            yield resp
+            nextlink = self._next_link(resp)
+            sizer.update(requested, returned, nbytes, elapsed, last=nextlink is None)
+
+    def iter_items(self, limit=10000, page_limit=500, headers=None):
+        """ Yield the Items for this search one page at a time, fetching Collections as they appear """
+        for page in self.pages(limit=limit, page_limit=page_limit, headers=headers):
+            start = time.perf_counter()
+            items = [Item(feature) for feature in page['features']]
+            self._emit('items', nitems=len(items), elapsed=time.perf_counter() - start)
+            for item in items:
+                cid = item._data.get('collection', None)
+                if cid is not None:
+                    item._collection = self._get_collection(cid, headers=headers)
+                yield item
+
+    def _get_collection(self, cid, headers=None):
+        """ Collection record, retrieved the first time it is needed (None if it can't be) """
+        if cid not in self._collections:
+            with self._collections_lock:
+                if cid not in self._collections:
+                    try:
+                        self._collections[cid] = self.collection(cid, headers=headers)
+                    except Exception as err:
+                        logger.debug('Unable to retrieve collection %s: %s' % (cid, err))
+                        self._collections[cid] = None
+        return self._collections[cid]
+
+    def items(self, limit=10000, page_limit=500, headers=None, stream=False, lazy=False):
+        """ Return all of the Items and Collections for this search
+
+        With stream=True a generator of Items is returned instead (see `iter_items`), so that
+        results can be processed as pages arrive without holding them all in memory. With
+        lazy=True a `satsearch.geojson.LazyItemCollection` is returned, which keeps the Items
+        encoded and decodes them only when accessed
+        """
+        if stream:
+            return self.iter_items(limit=limit, page_limit=page_limit, headers=headers)
+        if lazy:
+            items = LazyItemCollection()
+            cids = set()
+            for page in self.pages(limit=limit, page_limit=page_limit, headers=headers):
+                for feature in page['features']:
+                    items.append(feature)
+                    if 'collection' in feature:
+                        cids.add(feature['collection'])
+            collections = [self._get_collection(c, headers=headers) for c in sorted(cids)]
+            items._collections = [c for c in collections if c is not None]
+            return items
+
+        items = list(self.iter_items(limit=limit, page_limit=page_limit, headers=headers))
+        cids = set([item._data['collection'] for item in items if 'collection' in item._data])
+        collections = [self._collections[c] for c in cids if self._collections.get(c) is not None]
+        logger.debug(f"Found: {len(items)}")
+        return ItemCollection(items, collections=collections)
+
+    def table(self, limit=10000, page_limit=500, headers=None, properties=None, features=True):
+        """ Return the Items for this search as a compact `satsearch.table.ItemTable`
+
+        The table is built directly from the pages of results, without an Item for each result.
+        Only the given `properties` are kept as columns if provided, and the complete Items are
+        not kept with features=False
+        """
+        from satsearch.table import ItemTable
+        table = ItemTable(properties=properties, features=features)
+        for page in self.pages(limit=limit, page_limit=page_limit, headers=headers):
+            start = time.perf_counter()
+            table.extend(page['features'])
+            self._emit('items', nitems=len(page['features']), elapsed=time.perf_counter() - start)
+        cids = sorted(set(table.collection) - set([None]))
+        collections = [self._get_collection(cid, headers=headers) for cid in cids]
+        table._collections = [c for c in collections if c is not None]
+        return table
+
+    def shards(self, datetime_shards=1, bbox_shards=1):
+        """ Split this search into smaller searches over datetime intervals and/or bbox tiles """
+        datetimes = [self.kwargs.get('datetime', None)]
+        if datetime_shards > 1:
+            if datetimes[0] is not None and len(split_datetime(datetimes[0], datetime_shards)) > 1:
+                datetimes = split_datetime(datetimes[0], datetime_shards)
+            else:
+                logger.warning('Only a closed datetime interval can be sharded')
+        bboxes = [self.kwargs.get('bbox', None)]
+        if bbox_shards > 1:
+            if bboxes[0] is not None:
+                bboxes = split_bbox(bboxes[0], bbox_shards)
             else:
-                _headers = nextlink.get('headers', {})
-                _body = nextlink.get('body', {})
-                _body.update({'limit': page_limit})
-                
-                if nextlink.get('merge', False):
-                    _headers.update(headers or {})
-                    _body.update(self.kwargs)
-
-                resp = self.query(url=nextlink['href'], headers=headers, **_body)
-            items += [Item(i) for i in resp['features']]
-            links = [l for l in resp['links'] if l['rel'] == 'next']
-            nextlink = links[0] if len(links) == 1 else None
-       
-        # retrieve collections
-        collections = []
-        try:
-            for c in set([item._data['collection'] for item in items if 'collection' in item._data]):
-                collections.append(self.collection(c, headers=headers))
-                #del collections[c]['links']
-        except:
-            pass
+                logger.warning('Only a bbox search can be sharded by bbox')
+        searches = []
+        for dt in datetimes:
+            for bbox in bboxes:
+                kwargs = dict(self.kwargs)
+                if dt is not None:
+                    kwargs['datetime'] = dt
+                if bbox is not None:
+                    kwargs['bbox'] = bbox
+                searches.append(self._derived(kwargs))
+        return searches
+
+    def _derived(self, kwargs):
+        """ A search with other parameters, sharing the session, hooks, and Collections of this one """
+        # each search sizes its own pages, as they run concurrently
+        search = Search(url=self.url, session=self.session, cache=self.cache, hooks=self.hooks,
+                        page_sizer=None if self.page_sizer is None else self.page_sizer.copy(), **kwargs)
+        search.aoi = self.aoi
+        search._collections = self._collections
+        search._collections_lock = self._collections_lock
+        return search
+
+    def sharded_items(self, datetime_shards=1, bbox_shards=1, threads=8, limit=10000, page_limit=500, headers=None):
+        """ Return all of the Items and Collections for this search, fetching shards of it concurrently
+
+        The search is split by `shards`, each shard is paged through in its own thread, and
+        the results are merged with duplicates (Items in more than one shard) removed
+        """
+        searches = self.shards(datetime_shards=datetime_shards, bbox_shards=bbox_shards)
+        logger.debug('Searching %s shards with %s threads' % (len(searches), threads))
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = executor.map(
+                lambda s: list(s.iter_items(limit=limit, page_limit=page_limit, headers=headers)), searches)
+            items = {}
+            for result in results:
+                for item in result:
+                    items.setdefault(item.id, item)
+        items = list(items.values())
+        if 'sortby' in self.kwargs:
+            items = sort_items(items, self.kwargs['sortby'])
+        items = items[:self.limit or limit]
+        cids = set([item._data['collection'] for item in items if 'collection' in item._data])
+        collections = [self._collections[c] for c in cids if self._collections.get(c) is not None]
         logger.debug(f"Found: {len(items)}")
         return ItemCollection(items, collections=collections)
+
+    def id_chunks(self, chunk_size=100):
+        """ Split this search into searches for chunks of its ids """
+        ids = list(self.kwargs.get('ids', None) or [])
+        kwargs = {k: v for k, v in self.kwargs.items() if k != 'limit'}
+        return [self._derived(dict(kwargs, ids=ids[i:i + chunk_size])) for i in range(0, len(ids), chunk_size)]
+
+    def item(self, cid, id, headers=None):
+        """ Get an Item record from its Collection """
+        url = urljoin(self.url, 'collections/%s/items/%s' % (cid, id))
+        item = Item(self._request(url=url, headers=headers, method='GET')[0])
+        item._collection = self._get_collection(cid, headers=headers)
+        return item
+
+    def _find_item(self, id, cids, headers=None):
+        """ Get an Item from the first of the Collections that has it, or None """
+        for cid in cids:
+            try:
+                return self.item(cid, id, headers=headers)
+            except SatSearchError as err:
+                logger.debug('Item %s not found in %s: %s' % (id, cid, err))
+        return None
+
+    def items_by_id(self, chunk_size=100, threads=8, direct=False, page_limit=500, headers=None):
+        """ Return the Items for the ids of this search, in the same order, searching for chunks of ids concurrently
+
+        The ids are split into searches of `chunk_size` ids (see `id_chunks`), paged through
+        with up to `threads` at once. With direct=True, Items not found by searching are then
+        requested from collections/{cid}/items/{id} for each of the collections of this search.
+        The ids of any Items still not found are kept in `missing_ids`.
+        """
+        ids = list(dict.fromkeys(self.kwargs.get('ids', None) or []))
+        searches = self.id_chunks(chunk_size=chunk_size)
+        logger.debug('Searching for %s ids in %s chunks with %s threads' % (len(ids), len(searches), threads))
+        found = {}
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = executor.map(lambda s: list(s.iter_items(limit=len(s.kwargs['ids']), page_limit=page_limit,
+                                                               headers=headers)), searches)
+            for result in results:
+                for item in result:
+                    found.setdefault(item.id, item)
+            missing = [id for id in ids if id not in found]
+            cids = self.kwargs.get('collections', None) or []
+            if missing and direct and not cids:
+                logger.warning('Collections are needed to get Items directly')
+            elif missing and direct:
+                for item in executor.map(lambda id: self._find_item(id, cids, headers=headers), missing):
+                    if item is not None:
+                        found[item.id] = item
+        self.missing_ids = [id for id in ids if id not in found]
+        if self.missing_ids:
+            logger.warning('%s of %s ids not found' % (len(self.missing_ids), len(ids)))
+        items = [found[id] for id in ids if id in found][:self.limit]
+        cids = set([item._data['collection'] for item in items if 'collection' in item._data])
+        collections = [self._collections[c] for c in cids if self._collections.get(c) is not None]
+        return ItemCollection(items, collections=collections)
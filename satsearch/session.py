@@ -0,0 +1,78 @@
+import logging
+import requests
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# responses worth retrying (rate limited, or a flaky gateway in front of the API)
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class RateLimitedRetry(Retry):
+    """ Retry that waits for a `satsearch.ratelimit.RateLimiter` before each retry
+
+    A 429 response pauses the rate limiter for its Retry-After (or a second), so that every
+    thread and process sharing it waits rather than only this request.
+    """
+
+    rate_limiter = None
+
+    def new(self, **kwargs):
+        retry = super(RateLimitedRetry, self).new(**kwargs)
+        retry.rate_limiter = self.rate_limiter
+        return retry
+
+    def increment(self, method=None, url=None, response=None, *args, **kwargs):
+        if self.rate_limiter is not None and response is not None and response.status == 429:
+            self.rate_limiter.pause(self.get_retry_after(response) or 1.0)
+        return super(RateLimitedRetry, self).increment(method, url, response, *args, **kwargs)
+
+    def sleep(self, response=None):
+        if self.rate_limiter is None:
+            return super(RateLimitedRetry, self).sleep(response)
+        if response is None or response.status != 429:
+            # Retry-After of a 429 was already added to the rate limiter
+            super(RateLimitedRetry, self).sleep(response)
+        self.rate_limiter.acquire()
+
+
+class Session(requests.Session):
+    """ A pooled requests Session with retries, a default timeout, and optional rate limiting """
+
+    def __init__(self, pool_size=10, retries=3, backoff_factor=0.5, timeout=None, rate_limiter=None):
+        """ Initialize a Session
+
+        pool_size is the number of connections kept alive per host, retries the number of
+        times a failed request is retried (exponential backoff, honoring Retry-After) and
+        timeout the default (connect, read) timeout in seconds for every request. Every
+        request, including retries, waits for `rate_limiter` (see `satsearch.ratelimit`) if given
+        """
+        super(Session, self).__init__()
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        retry = RateLimitedRetry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            # STAC searches are POSTs, but they are safe to repeat
+            allowed_methods=None,
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        retry.rate_limiter = rate_limiter
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        """ Send a request, applying the default timeout """
+        if kwargs.get('timeout', None) is None:
+            kwargs['timeout'] = self.timeout
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        return super(Session, self).request(method, url, **kwargs)
@@ -0,0 +1,63 @@
+import threading
+import time
+
+
+class Stats(object):
+    """ Hook for `Search` that accumulates request, pagination and parsing statistics """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.requests = 0
+        self.cached = 0
+        self.errors = 0
+        self.nbytes = 0
+        self.latencies = []
+        self.decode = 0
+        self.pages = 0
+        self.nitems = 0
+        self.items_elapsed = 0
+        self.collections = 0
+        self.collections_elapsed = 0
+
+    def __call__(self, event, **info):
+        with self.lock:
+            if event == 'request':
+                self.requests += 1
+                self.cached += info['cached']
+                self.errors += info['status'] != 200
+                self.nbytes += info['nbytes']
+                self.latencies.append(info['elapsed'])
+                self.decode += info['decode']
+            elif event == 'page':
+                self.pages += 1
+            elif event == 'items':
+                self.nitems += info['nitems']
+                self.items_elapsed += info['elapsed']
+            elif event == 'collection':
+                self.collections += 1
+                self.collections_elapsed += info['elapsed']
+
+    def percentile(self, p):
+        """ Percentile of request latencies """
+        if len(self.latencies) == 0:
+            return 0
+        latencies = sorted(self.latencies)
+        return latencies[min(int(len(latencies) * p / 100), len(latencies) - 1)]
+
+    def report(self):
+        """ Summary of timing and throughput """
+        elapsed = time.perf_counter() - self.start
+        mb = self.nbytes / 1024 / 1024
+        ms = lambda s: s * 1000
+        txt = 'Requests: %s (%s cached, %s errors), %.2f MB\n' % (self.requests, self.cached, self.errors, mb)
+        if self.requests > 0:
+            txt += 'Latency: mean %.0f ms, median %.0f ms, 95th percentile %.0f ms, max %.0f ms\n' % (
+                ms(sum(self.latencies) / len(self.latencies)), ms(self.percentile(50)), ms(self.percentile(95)),
+                ms(max(self.latencies)))
+        txt += 'Pages: %s, Items: %s\n' % (self.pages, self.nitems)
+        txt += 'JSON decode: %.3f s, Item construction: %.3f s\n' % (self.decode, self.items_elapsed)
+        txt += 'Collections: %s in %.3f s\n' % (self.collections, self.collections_elapsed)
+        txt += 'Total: %.2f s, %.1f items/s, %.2f MB/s' % (
+            elapsed, self.nitems / elapsed if elapsed > 0 else 0, mb / elapsed if elapsed > 0 else 0)
+        return txt
@@ -0,0 +1,367 @@
+import logging
+import math
+import sys
+import zlib
+
+from array import array
+from datetime import datetime, timezone
+from dateutil.parser import parse as dateparse
+from satstac import Item, ItemCollection
+from satstac.itemcollection import terminal_calendar
+from satsearch import fastjson
+from satsearch.geometry import Shape, envelope
+from satsearch.index import QUERY_OPS, timestamp
+from satsearch.search import SatSearchError
+
+logger = logging.getLogger(__name__)
+
+NAN = float('nan')
+# stands in for a missing value in an integer column
+MISSING_INT = -2 ** 63
+
+
+def epoch(value):
+    """ Seconds since the epoch of a datetime string, which is UTC if it has no time zone """
+    try:
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        dt = dateparse(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _kind(value):
+    """ Kind of column needed to hold a value """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 'object'
+    if isinstance(value, int):
+        return 'int' if MISSING_INT < value < 2 ** 63 else 'object'
+    if isinstance(value, float):
+        return 'float'
+    if isinstance(value, str):
+        return 'str'
+    return 'object'
+
+
+class Column(object):
+    """ Values of one field for all Items, in a typed array if they are all ints or all floats
+
+    Values of mixed types (including ints and floats) are kept as they are, so they print the
+    same as in the Items. Strings are interned, so values repeated across Items are only stored
+    once.
+    """
+
+    def __init__(self, kind=None):
+        self.kind = kind
+        self.values = self._container(kind)
+
+    @staticmethod
+    def _container(kind):
+        if kind == 'int':
+            return array('q')
+        if kind == 'float':
+            return array('d')
+        return []
+
+    def _store(self, value):
+        if self.kind == 'int':
+            return MISSING_INT if value is None else value
+        if self.kind == 'float':
+            return NAN if value is None else float(value)
+        if self.kind == 'str' and value is not None:
+            return sys.intern(value)
+        return value
+
+    def _convert(self, kind):
+        values = list(self)
+        self.kind = kind
+        self.values = self._container(kind)
+        self.values.extend([self._store(v) for v in values])
+
+    def append(self, value):
+        kind = _kind(value)
+        if kind is not None and kind != self.kind and self.kind != 'object':
+            self._convert(kind if self.kind is None else 'object')
+        self.values.append(self._store(value))
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        value = self.values[index]
+        if self.kind == 'int' and value == MISSING_INT:
+            return None
+        if self.kind == 'float' and math.isnan(value):
+            return None
+        return value
+
+    def __iter__(self):
+        for i in range(len(self.values)):
+            yield self[i]
+
+    def take(self, indices):
+        """ New Column of the values at indices """
+        column = Column(self.kind)
+        column.values.extend([self.values[i] for i in indices])
+        return column
+
+
+class ItemTable(object):
+    """ Compact, column oriented container of Items
+
+    The id, collection, datetime, bbox, scalar properties (all of them, or those given) and
+    asset hrefs of each Item are kept in columns, with ints and floats in typed arrays and
+    strings interned, so that filtering, sorting, and printing summaries and calendars of
+    large numbers of Items is fast and doesn't need an Item per result. The complete Items
+    are kept as compressed JSON (unless features=False) and only turned back into Items (or
+    dictionaries) when asked for. Iterating over an ItemTable yields Items, and summary()
+    and calendar() give the same output as an ItemCollection.
+    """
+
+    def __init__(self, properties=None, features=True, collections=[]):
+        self._names = None if properties is None else set(properties)
+        self._features = [] if features else None
+        self._collections = list(collections)
+        self.ids = []
+        self.collection = Column('str')
+        # datetimes as given, for printing, and as seconds since the epoch
+        self.datetimes = []
+        self.datetime = array('d')
+        # minx, miny, maxx, maxy
+        self.bbox = [array('d') for i in range(4)]
+        self.properties = {}
+        self.assets = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        return self.item(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.item(i)
+
+    def append(self, feature):
+        """ Add an Item (or Feature dictionary) """
+        if isinstance(feature, Item):
+            feature = feature._data
+        n = len(self)
+        props = feature.get('properties', {})
+        self.ids.append(feature['id'])
+        self.collection.append(feature.get('collection', props.get('collection', None)))
+        dt = props.get('datetime', None) or props.get('start_datetime', None)
+        self.datetimes.append(dt)
+        self.datetime.append(NAN if dt is None else epoch(dt))
+        bbox = feature.get('bbox', None)
+        if bbox is None and feature.get('geometry', None) is not None:
+            bbox = envelope(feature['geometry'])
+        if bbox is None:
+            bbox = [NAN] * 4
+        # 2D or 3D bbox
+        m = len(bbox) // 2
+        for column, value in zip(self.bbox, [bbox[0], bbox[1], bbox[m], bbox[m + 1]]):
+            column.append(value)
+        for key, value in props.items():
+            if key in ('datetime', 'collection') or isinstance(value, (dict, list)):
+                continue
+            if self._names is not None and key not in self._names:
+                continue
+            self._column(self.properties, key, n).append(value)
+        for key, asset in feature.get('assets', {}).items():
+            self._column(self.assets, key, n).append(asset.get('href', None))
+        # fill in values missing from this Item
+        for columns in (self.properties, self.assets):
+            for column in columns.values():
+                if len(column) == n:
+                    column.append(None)
+        if self._features is not None:
+            self._features.append(zlib.compress(fastjson.dumpb(feature), 1))
+
+    @staticmethod
+    def _column(columns, key, n):
+        """ Column for key, created (with n missing values) if there isn't one """
+        if key not in columns:
+            columns[sys.intern(key)] = column = Column()
+            for i in range(n):
+                column.append(None)
+        return columns[key]
+
+    def extend(self, features):
+        """ Add Items (or Feature dictionaries) """
+        for feature in features:
+            self.append(feature)
+
+    def get_collection(self, id):
+        """ Collection record with this id, if there is one """
+        cols = [c for c in self._collections if c.id == id]
+        return cols[0] if len(cols) == 1 else None
+
+    def feature(self, index):
+        """ Item at index as a Feature dictionary """
+        if self._features is None:
+            raise SatSearchError('Items were not kept in this ItemTable (features=False)')
+        return fastjson.loads(zlib.decompress(self._features[index]))
+
+    def item(self, index):
+        """ Item at index """
+        item = Item(self.feature(index))
+        cid = self.collection[index]
+        if cid is not None:
+            item._collection = self.get_collection(cid)
+        return item
+
+    def to_items(self):
+        """ All Items as an ItemCollection """
+        return ItemCollection([self.item(i) for i in range(len(self))], collections=self._collections)
+
+    def date(self, index):
+        """ Date of the Item at index, in the time zone of its datetime """
+        dt = self.datetimes[index]
+        if dt is None:
+            return None
+        try:
+            return datetime.fromisoformat(dt[:10]).date()
+        except ValueError:
+            return dateparse(dt).date()
+
+    def dates(self):
+        """ Sorted list of dates of all Items """
+        return sorted(set([self.date(i) for i in range(len(self))]) - set([None]))
+
+    def value(self, key, index):
+        """ Value of a field for the Item at index, from the Collection if the Item doesn't have it """
+        if key == 'id':
+            return self.ids[index]
+        if key == 'collection':
+            return self.collection[index]
+        if key in ('date', 'year', 'month', 'day'):
+            date = self.date(index)
+            return date if key == 'date' else getattr(date, key)
+        if key == 'datetime':
+            return self.datetimes[index]
+        value = self.properties[key][index] if key in self.properties else None
+        if value is None and self.collection[index] is not None:
+            collection = self.get_collection(self.collection[index])
+            if collection is not None:
+                value = collection.properties.get(key, None)
+        return value
+
+    def hrefs(self, key):
+        """ hrefs of the asset key for all Items (None where an Item doesn't have it) """
+        return list(self.assets[key]) if key in self.assets else [None] * len(self)
+
+    def summary(self, params=[]):
+        """ Summary of all Items, the same as `ItemCollection.summary` """
+        if len(params) == 0:
+            params = ['date', 'id']
+        columns = [[str(self.value(p, i)) for i in range(len(self))] for p in params]
+        txt = 'Items (%s):\n' % len(self)
+        txt += ''.join(['{:<25} '.format(p) for p in params]) + '\n'
+        txt += ''.join([''.join(['{:<25} '.format(v) for v in row]) + '\n' for row in zip(*columns)])
+        return txt
+
+    def calendar(self, group='platform'):
+        """ Calendar of dates, the same as `ItemCollection.calendar` """
+        groups = {}
+        for i in range(len(self)):
+            groups.setdefault(self.date(i), set()).add(self.value(group, i))
+        groups.pop(None, None)
+        date_labels = {d: 'Multiple' if len(g) > 1 else list(g)[0] for d, g in groups.items()}
+        return terminal_calendar(date_labels)
+
+    def take(self, indices):
+        """ New ItemTable of the Items at indices """
+        table = ItemTable(features=self._features is not None, collections=self._collections)
+        table._names = self._names
+        table.ids = [self.ids[i] for i in indices]
+        table.collection = self.collection.take(indices)
+        table.datetimes = [self.datetimes[i] for i in indices]
+        table.datetime = array('d', [self.datetime[i] for i in indices])
+        table.bbox = [array('d', [column[i] for i in indices]) for column in self.bbox]
+        table.properties = {k: c.take(indices) for k, c in self.properties.items()}
+        table.assets = {k: c.take(indices) for k, c in self.assets.items()}
+        if self._features is not None:
+            table._features = [self._features[i] for i in indices]
+        return table
+
+    def _matches(self, key, op, value):
+        """ Indices of Items with a property matching one STAC query operator """
+        if op not in QUERY_OPS:
+            raise SatSearchError('Unsupported query operator %s' % op)
+        values = value if op == 'in' else [value]
+        try:
+            values = [float(v) for v in values]
+            numeric = True
+        except (TypeError, ValueError):
+            values = [str(v) for v in values]
+            numeric = False
+        column = self.properties.get(key, Column())
+        if numeric:
+            # values of a mixed column that can be compared with the query
+            candidates = [(i, v) for i, v in enumerate(column)
+                          if isinstance(v, (int, float)) and not isinstance(v, bool)]
+        else:
+            candidates = [(i, v) for i, v in enumerate(column) if isinstance(v, str)]
+        if op == 'in':
+            matched = [i for i, v in candidates if v in values]
+        else:
+            v0 = values[0]
+            compare = {
+                'eq': lambda v: v == v0, 'neq': lambda v: v == v0, 'lt': lambda v: v < v0,
+                'lte': lambda v: v <= v0, 'gt': lambda v: v > v0, 'gte': lambda v: v >= v0
+            }[op]
+            matched = [i for i, v in candidates if compare(v)]
+        if op == 'neq':
+            matched = sorted(set(range(len(self))) - set(matched))
+        return matched
+
+    def filter(self, ids=None, collections=None, bbox=None, intersects=None, datetime=None, query=None):
+        """ New ItemTable of the Items matching search parameters, as for `satsearch.index.Index.search`
+
+        Without the Items (features=False), Items match intersects if their bbox intersects it
+        """
+        indices = range(len(self))
+        if ids:
+            ids = set(ids)
+            return self.take([i for i in indices if self.ids[i] in ids])
+        if collections:
+            collections = set(collections)
+            indices = [i for i in indices if self.collection[i] in collections]
+        boxes = [] if bbox is None else [[float(b) for b in bbox]]
+        if intersects is not None:
+            boxes.append(envelope(intersects))
+        minx, miny, maxx, maxy = self.bbox
+        for b in boxes:
+            indices = [i for i in indices if minx[i] <= b[2] and maxx[i] >= b[0] and miny[i] <= b[3] and maxy[i] >= b[1]]
+        if intersects is not None and self._features is not None:
+            shape = Shape(intersects)
+            indices = [i for i in indices if shape.intersects(self.feature(i).get('geometry', None))]
+        if datetime is not None:
+            parts = datetime.split('/')
+            start, end = (parts[0], parts[0]) if len(parts) == 1 else parts
+            start = -math.inf if start in ('', '..') else epoch(timestamp(start))
+            end = math.inf if end in ('', '..') else epoch(timestamp(end, end=True))
+            indices = [i for i in indices if start <= self.datetime[i] <= end]
+        for key, ops in (query or {}).items():
+            if not isinstance(ops, dict):
+                ops = {'eq': ops}
+            for op, value in ops.items():
+                matched = set(self._matches(key, op, value))
+                indices = [i for i in indices if i in matched]
+        return self.take(indices)
+
+    def sort(self, sortby):
+        """ New ItemTable sorted by STAC sortby fields, ordered as by `satsearch.search.sort_items` """
+        indices = list(range(len(self)))
+        for sort in reversed(sortby):
+            field = sort['field']
+            if field.startswith('properties.'):
+                field = field[len('properties.'):]
+            values = [self.value(field, i) for i in range(len(self))]
+            indices = sorted(indices, key=lambda i: (values[i] is not None, values[i]),
+                             reverse=sort.get('direction') == 'desc')
+        return self.take(indices)
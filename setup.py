@@ -42,6 +42,10 @@ setup(
     packages=find_packages(exclude=['docs', 'tests*']),
     include_package_data=True,
     install_requires=install_requires,
+    extras_require={
+        'async': ['aiohttp'],
+        'fast': ['orjson'],
+    },
     dependency_links=dependency_links,
     setup_requires=['pytest-runner'],
     tests_require=['pytest'],
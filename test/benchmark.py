@@ -0,0 +1,170 @@
+""" Offline benchmarks of sat-search against the local stand-in STAC API (see stacserver.py)
+
+Run with `python -m test.benchmark` from the repository root. Each scenario reports Items per
+second, the number of requests the API received, the peak RSS of the process doing the
+search, and the elapsed time. Library scenarios run in a fresh process each so peak RSS is
+not shared between them, and CLI scenarios time the whole `sat-search` command, reporting the
+Items it printed or saved.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from .stacserver import StacServer, TEMPLATES
+
+rootpath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name: (type, server options, search options)
+SCENARIOS = {
+    'found': ('found', {}, {}),
+    'items': ('items', {}, {}),
+    'items-stream': ('stream', {}, {}),
+    'items-lazy': ('lazy', {}, {}),
+    'items-stdlib-json': ('items', {}, {'json': 'json'}),
+    'items-get-links': ('items', {'link_style': 'GET'}, {}),
+    'items-latency': ('items', {'latency': 0.02}, {'session': True}),
+    'items-errors': ('items', {'error_rate': 0.1}, {'session': True}),
+    'items-adaptive': ('items', {'latency': 0.02}, {'session': True, 'adaptive': True}),
+    'items-fields': ('items', {}, {'fields': {'include': ['id', 'collection', 'properties.datetime',
+                                                          'properties.eo:cloud_cover'], 'exclude': ['links']}}),
+    'cli-startup': ('startup', {}, {'args': ['--version']}),
+    'cli-found': ('cli', {}, {'args': ['--found']}),
+    'cli-print-md': ('cli', {}, {'args': ['--print-md', 'eo:cloud_cover']}),
+    'cli-save': ('cli', {}, {'args': ['--save', '{tmpdir}/items.json']}),
+    'cli-save-stdlib-json': ('cli', {}, {'args': ['--save', '{tmpdir}/items.json'], 'json': 'json'}),
+}
+
+# runs the CLI, saving its peak RSS (kB) since exec to a file when it exits. A child's ru_maxrss
+# starts from that of the parent when forked, so can't be used for a small process on Linux
+CLI_PEAK_RSS = '''
+import atexit, os, runpy
+def save_peak_rss():
+    with open('/proc/self/status') as f, open(os.environ['BENCHMARK_RSS_FILE'], 'w') as out:
+        out.write([line.split()[1] for line in f if line.startswith('VmHWM:')][0])
+atexit.register(save_peak_rss)
+runpy.run_module('satsearch.cli', run_name='__main__', alter_sys=True)
+'''
+
+
+def peak_rss(usage=None):
+    """ Peak resident set size in MB, of this process or as given by a resource usage """
+    rss = (usage or resource.getrusage(resource.RUSAGE_SELF)).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+
+
+def run_search(kind, url, page_limit, session=False, json_backend=None, adaptive=False, fields=None):
+    """ Run a search in this process, returning number of Items, seconds, and peak RSS """
+    from satsearch import fastjson
+    from satsearch.paging import PageSizer
+    from satsearch.search import Search
+    from satsearch.session import Session
+    fastjson.use(json_backend)
+    kwargs = {} if fields is None else {'fields': fields}
+    search = Search(url=url, session=Session(backoff_factor=0) if session else None,
+                    page_sizer=PageSizer() if adaptive else None, **kwargs)
+    start = time.perf_counter()
+    if kind == 'found':
+        nitems = search.found()
+    elif kind == 'stream':
+        nitems = sum(1 for item in search.items(page_limit=page_limit, stream=True))
+    elif kind == 'lazy':
+        nitems = len(search.items(page_limit=page_limit, lazy=True))
+    else:
+        nitems = len(search.items(page_limit=page_limit))
+    return nitems, time.perf_counter() - start, peak_rss()
+
+
+def run_cli(url, args, tmpdir, json_backend=None):
+    """ Run the sat-search CLI in a subprocess, returning its output, seconds, and peak RSS """
+    env = dict(os.environ, PYTHONPATH=rootpath, BENCHMARK_RSS_FILE=os.path.join(tmpdir, 'peak-rss'))
+    if json_backend is not None:
+        env['SATSEARCH_JSON'] = json_backend
+    procfs = os.path.exists('/proc/self/status')
+    cmd = [sys.executable] + (['-c', CLI_PEAK_RSS] if procfs else ['-m', 'satsearch.cli'])
+    cmd += ['search', '--url', url, '-v', '0'] + args
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, env=env, cwd=rootpath, stdout=subprocess.PIPE, universal_newlines=True)
+    with proc.stdout:
+        out = proc.stdout.read()
+    # resource usage of this child alone, RUSAGE_CHILDREN would include all children so far
+    pid, status, usage = os.wait4(proc.pid, 0)
+    seconds = time.perf_counter() - start
+    proc.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, output=out)
+    if procfs:
+        with open(env['BENCHMARK_RSS_FILE']) as f:
+            return out, seconds, int(f.read()) / 1024
+    return out, seconds, peak_rss(usage)
+
+
+def cli_items(args, out):
+    """ Number of Items the CLI saved or printed, None if it did neither """
+    if '--save' in args:
+        with open(args[args.index('--save') + 1]) as f:
+            return len(json.load(f)['features'])
+    match = re.search(r'^Items \((\d+)\):$', out, re.MULTILINE)
+    return None if match is None else int(match.group(1))
+
+
+def benchmark(nitems=5000, page_limit=500, scenarios=None):
+    """ Run benchmark scenarios, returning a list of results """
+    results = []
+    ctx = multiprocessing.get_context('spawn')
+    for name in scenarios or SCENARIOS:
+        kind, server_options, options = SCENARIOS[name]
+        with StacServer(nitems=nitems, templates=TEMPLATES, **server_options) as api, \
+                tempfile.TemporaryDirectory() as tmpdir:
+            if kind in ('cli', 'startup'):
+                args = [a.format(tmpdir=tmpdir) for a in options['args']]
+                out, seconds, rss = run_cli(api.url, args, tmpdir, json_backend=options.get('json', None))
+                n = cli_items(args, out)
+            else:
+                with ctx.Pool(1) as pool:
+                    n, seconds, rss = pool.apply(run_search, (kind, api.url, page_limit, options.get('session', False),
+                                                              options.get('json', None),
+                                                              options.get('adaptive', False),
+                                                              options.get('fields', None)))
+            results.append({
+                'scenario': name,
+                'items': n,
+                'seconds': seconds,
+                'items_per_second': n / seconds if n is not None and kind != 'found' and seconds > 0 else None,
+                'requests': len(api.requests),
+                'peak_rss_mb': rss
+            })
+    return results
+
+
+def report(results):
+    """ Table of benchmark results """
+    txt = '{:<18}{:>8}{:>10}{:>12}{:>10}{:>10}\n'.format('Scenario', 'Items', 'Seconds', 'Items/s', 'Requests',
+                                                       'RSS (MB)')
+    for r in results:
+        rate = '-' if r['items_per_second'] is None else '%.0f' % r['items_per_second']
+        n = '-' if r['items'] is None else r['items']
+        txt += '{:<18}{:>8}{:>10.3f}{:>12}{:>10}{:>10.1f}\n'.format(r['scenario'], n, r['seconds'], rate,
+                                                                   r['requests'], r['peak_rss_mb'])
+    return txt
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark sat-search against a local stand-in STAC API')
+    parser.add_argument('--nitems', help='Number of Items served', default=5000, type=int)
+    parser.add_argument('--page-limit', help='Page size requested', default=500, type=int)
+    parser.add_argument('--scenarios', help='Scenarios to run', nargs='*', choices=list(SCENARIOS), default=None)
+    parser.add_argument('--json', help='Save results as JSON', default=None)
+    args = parser.parse_args()
+    results = benchmark(nitems=args.nitems, page_limit=args.page_limit, scenarios=args.scenarios)
+    print(report(results))
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,267 @@
+""" A local stand-in for a STAC API, used to test and benchmark sat-search without network access
+
+Run standalone with `python -m test.stacserver --nitems 10000` from the repository root.
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import threading
+import time
+
+from datetime import datetime, timedelta
+from dateutil.parser import parse as dateparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from satsearch.geometry import Shape
+
+testpath = os.path.dirname(__file__)
+
+TEMPLATES = ['landsat-item1.json', 'landsat-item2.json', 'sentinel-response.json']
+
+
+def synthetic_items(nitems, templates=['landsat-item1.json'], start=datetime(2020, 1, 1)):
+    """ Generate nitems Items, one hour apart, cycling through template Items """
+    _templates = []
+    for template in templates:
+        with open(os.path.join(testpath, template)) as f:
+            template = json.load(f)
+        # older templates have the collection (or c:id) in properties
+        props = template['properties']
+        template['collection'] = template.get('collection', props.get('collection', props.get('c:id')))
+        _templates.append(template)
+    items = []
+    for i in range(nitems):
+        item = copy.deepcopy(_templates[i % len(_templates)])
+        item['id'] = 'item-%s' % i
+        item['properties']['datetime'] = (start + timedelta(hours=i)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        items.append(item)
+    return items
+
+
+def project(item, fields):
+    """ Parts of an Item given by a STAC fields object (include and exclude lists of dotted keys) """
+    include, exclude = fields.get('include', None) or [], fields.get('exclude', None) or []
+    if include:
+        result = {}
+        for field in include:
+            src, dst, keys = item, result, field.split('.')
+            for key in keys[:-1]:
+                if key not in src:
+                    break
+                src, dst = src[key], dst.setdefault(key, {})
+            else:
+                if keys[-1] in src:
+                    dst[keys[-1]] = copy.deepcopy(src[keys[-1]])
+    else:
+        result = copy.deepcopy(item)
+    for field in exclude:
+        if field in include:
+            continue
+        parent, keys = result, field.split('.')
+        for key in keys[:-1]:
+            parent = parent.get(key, {})
+        parent.pop(keys[-1], None)
+    return result
+
+
+def collections():
+    """ Collection records used for the synthetic Items """
+    with open(os.path.join(testpath, 'scenes.geojson')) as f:
+        return {c['id']: c for c in json.load(f)['collections']}
+
+
+class StacServer(object):
+    """ Serves synthetic Items from /search and Collections from /collections/{id}
+
+    `errors` is a list of status codes returned (in order) for the first requests made, to
+    simulate a flaky API, and `retry_after` is sent along with them. After that, requests fail
+    with a 503 at random with probability `error_rate`, and every response is delayed by
+    `latency` seconds. Next links are POST links with the token in the body, or GET links with
+    the token in the URL if `link_style` is 'GET'. Files in `assets` (a dict of name: bytes)
+    are served from /assets/{name}, with support for Range requests. If `page_size` is given,
+    pages are that size regardless of the limit requested. Items are also served from
+    /collections/{cid}/items/{id}, and those with ids in `unindexed` only from there. Searches
+    with fields are answered with only those fields of Items, or a 400 error if `fields` is False.
+    """
+
+    def __init__(self, nitems=0, items=None, templates=['landsat-item1.json'], errors=None, retry_after=None,
+                 error_rate=0, latency=0, link_style='POST', assets=None, page_size=None, unindexed=None,
+                 fields=True, port=0, seed=0):
+        self.items = synthetic_items(nitems, templates=templates) if items is None else items
+        self.page_size = page_size
+        self.unindexed = set(unindexed or [])
+        self.fields = fields
+        self.assets = assets or {}
+        self.collections = collections()
+        self.errors = list(errors or [])
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.latency = latency
+        self.link_style = link_style
+        self.random = random.Random(seed)
+        self.requests = []
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self.handler())
+        self.url = 'http://127.0.0.1:%s/' % self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def filter(self, body):
+        """ Items matching the ids, collections, datetime, bbox and intersects of a search, sorted by sortby """
+        items = [i for i in self.items if i['id'] not in self.unindexed]
+        if 'ids' in body:
+            items = [i for i in items if i['id'] in body['ids']]
+        if 'collections' in body:
+            items = [i for i in items if i['collection'] in body['collections']]
+        if 'datetime' in body:
+            dts = body['datetime'].split('/')
+            if len(dts) == 1:
+                items = [i for i in items if i['properties']['datetime'].startswith(dts[0])]
+            else:
+                start, end = [None if d in ('', '..') else dateparse(d).replace(tzinfo=None) for d in dts]
+                dt = lambda i: dateparse(i['properties']['datetime']).replace(tzinfo=None)
+                items = [i for i in items if (start is None or dt(i) >= start) and (end is None or dt(i) <= end or
+                         # a partial date ends at the end of its period
+                         i['properties']['datetime'].startswith(dts[1]))]
+        if 'bbox' in body:
+            b = [float(v) for v in body['bbox']]
+            items = [i for i in items if i['bbox'][0] <= b[2] and i['bbox'][2] >= b[0] and
+                     i['bbox'][1] <= b[3] and i['bbox'][3] >= b[1]]
+        if 'intersects' in body:
+            shape = Shape(body['intersects'])
+            items = [i for i in items if shape.intersects(i['geometry'])]
+        for sort in reversed(body.get('sortby', None) or []):
+            field = sort['field'].replace('properties.', '')
+            items = sorted(items, key=lambda i: i['properties'].get(field, i.get(field)),
+                           reverse=sort.get('direction', 'asc') == 'desc')
+        return items
+
+    def search(self, body):
+        """ Return a page of the search results """
+        limit = int(body.get('limit', 10)) if self.page_size is None else self.page_size
+        token = int(body.get('token', 0))
+        items = self.filter(body)
+        features = items[token:token + limit]
+        if 'fields' in body:
+            features = [project(f, body['fields']) for f in features]
+        links = []
+        if token + limit < len(items) and limit > 0:
+            if self.link_style == 'GET':
+                query = urlencode({'token': token + limit, 'limit': limit})
+                links.append({'rel': 'next', 'href': self.url + 'search?' + query})
+            else:
+                links.append({
+                    'rel': 'next',
+                    'method': 'POST',
+                    'href': self.url + 'search',
+                    'body': {'token': token + limit},
+                    'merge': True
+                })
+        return {
+            'type': 'FeatureCollection',
+            'features': features,
+            'links': links,
+            'context': {'matched': len(items), 'returned': len(features), 'limit': limit}
+        }
+
+    def asset(self, name, headers):
+        """ Return (a range of) an asset """
+        content = self.assets[name]
+        if 'Range' in headers:
+            start = int(headers['Range'].replace('bytes=', '').split('-')[0])
+            if start >= len(content):
+                return 416, {}, b''
+            return 206, {'Content-Range': 'bytes %s-%s/%s' % (start, len(content) - 1, len(content))}, content[start:]
+        return 200, {}, content
+
+    def respond(self, method, path, body, headers={}):
+        """ Return the status code, headers, and JSON response (or bytes) for a request """
+        self.requests.append({'method': method, 'path': path, 'body': body, 'headers': dict(headers)})
+        if self.latency > 0:
+            time.sleep(self.latency)
+        error = self.errors.pop(0) if len(self.errors) > 0 else None
+        if error is None and self.error_rate > 0 and self.random.random() < self.error_rate:
+            error = 503
+        if error is not None:
+            headers = {} if self.retry_after is None else {'Retry-After': str(self.retry_after)}
+            return error, headers, {'code': 'error', 'description': 'injected error'}
+        url = urlsplit(path)
+        path = url.path
+        # parameters of GET next links
+        body = dict(dict(parse_qsl(url.query)), **body)
+        if path.startswith('/assets/') and path[8:] in self.assets:
+            return self.asset(path[8:], headers)
+        if path == '/search' and 'fields' in body and not self.fields:
+            return 400, {}, {'code': 'BadRequest', 'description': 'Unknown parameter fields'}
+        if path == '/search':
+            return 200, {}, self.search(body)
+        if path.startswith('/collections/') and '/items/' in path:
+            cid, id = path.split('/')[2], path.split('/')[4]
+            items = [i for i in self.items if i['id'] == id and i['collection'] == cid]
+            if len(items) > 0:
+                return 200, {}, items[0]
+        elif path.startswith('/collections/'):
+            cid = path.split('/')[2]
+            if cid in self.collections:
+                return 200, {}, self.collections[cid]
+        return 404, {}, {'code': 'NotFound', 'description': 'No such path %s' % path}
+
+    def handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                self.reply(api.respond('GET', self.path, {}, self.headers))
+
+            def do_HEAD(self):
+                self.reply(api.respond('HEAD', self.path, {}, self.headers), body=False)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                self.reply(api.respond('POST', self.path, body, self.headers))
+
+            def reply(self, response, body=True):
+                status, headers, data = response
+                content = data if isinstance(data, bytes) else json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                if body:
+                    self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local stand-in STAC API serving synthetic Items')
+    parser.add_argument('--nitems', help='Number of Items', default=1000, type=int)
+    parser.add_argument('--port', help='Port to listen on', default=8000, type=int)
+    parser.add_argument('--latency', help='Delay of each response (seconds)', default=0, type=float)
+    parser.add_argument('--error-rate', help='Probability of a 503 response', default=0, type=float)
+    parser.add_argument('--link-style', help='Style of next links', default='POST', choices=['POST', 'GET'])
+    parser.add_argument('--page-size', help='Page size, regardless of limit requested', default=None, type=int)
+    args = parser.parse_args()
+    with StacServer(nitems=args.nitems, templates=TEMPLATES, latency=args.latency, error_rate=args.error_rate,
+                    link_style=args.link_style, page_size=args.page_size, port=args.port) as api:
+        print('Serving %s Items at %s' % (args.nitems, api.url))
+        try:
+            api.thread.join()
+        except KeyboardInterrupt:
+            pass
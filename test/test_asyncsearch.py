@@ -0,0 +1,73 @@
+import asyncio
+import unittest
+
+from satstac import Item
+from satsearch.asyncsearch import AsyncSearch, aiohttp
+
+from .stacserver import StacServer
+
+
+@unittest.skipIf(aiohttp is None, 'aiohttp not installed')
+class Test(unittest.TestCase):
+
+    def test_search(self):
+        """ Translate query and sortby as with Search """
+        search = AsyncSearch.search(url='http://localhost', query=['eo:cloud_cover<=10'], sortby=['-datetime'])
+        self.assertTrue(isinstance(search, AsyncSearch))
+        self.assertEqual(search.kwargs['query'], {'eo:cloud_cover': {'lte': '10'}})
+
+    def test_found(self):
+        """ Get number of hits """
+        async def found(url):
+            async with AsyncSearch(url=url) as search:
+                return await search.found()
+        with StacServer(nitems=25) as api:
+            self.assertEqual(asyncio.run(found(api.url)), 25)
+
+    def test_items(self):
+        """ Get all Items and their Collections """
+        async def items(url):
+            async with AsyncSearch(url=url, concurrency=2) as search:
+                return await search.items(page_limit=10)
+        with StacServer(nitems=25) as api:
+            items = asyncio.run(items(api.url))
+            self.assertEqual(len(items), 25)
+            self.assertTrue(isinstance(items[0], Item))
+            self.assertEqual(items[0].collection().id, 'landsat-8-l1')
+            # 3 pages and 1 collection
+            self.assertEqual(len(api.requests), 4)
+
+    def test_table(self):
+        """ Get all Items as a table """
+        async def table(url):
+            async with AsyncSearch(url=url) as search:
+                return await search.table(page_limit=10, properties=['eo:cloud_cover'])
+        with StacServer(nitems=25) as api:
+            table = asyncio.run(table(api.url))
+            self.assertEqual(len(api.requests), 4)
+        self.assertEqual(table.ids, ['item-%s' % i for i in range(25)])
+        self.assertEqual(list(table.properties), ['eo:cloud_cover'])
+        self.assertEqual([c.id for c in table._collections], ['landsat-8-l1'])
+        self.assertEqual(table[0].collection().id, 'landsat-8-l1')
+
+    def test_iter_items(self):
+        """ Iterate through Items asynchronously """
+        async def ids(url):
+            async with AsyncSearch(url=url) as search:
+                return [item.id async for item in search.iter_items(page_limit=10)]
+        with StacServer(nitems=25) as api:
+            self.assertEqual(asyncio.run(ids(api.url)), ['item-%s' % i for i in range(25)])
+
+    def test_items_fields_unsupported(self):
+        """ Count, then get complete Items from an API without the fields extension """
+        async def items(url):
+            async with AsyncSearch(url=url, fields={'include': ['id']}) as search:
+                return await search.found(), await search.items(page_limit=10)
+        with StacServer(nitems=25, fields=False) as api:
+            with self.assertLogs('satsearch.asyncsearch', level='WARNING'):
+                found, items = asyncio.run(items(api.url))
+            searches = [r['body'] for r in api.requests if r['path'] == '/search']
+        self.assertEqual(found, 25)
+        self.assertEqual(len(items), 25)
+        self.assertIn('assets', items[0]._data)
+        self.assertEqual(['fields' in s for s in searches], [False, True, False, False, False])
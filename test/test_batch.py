@@ -0,0 +1,84 @@
+import os
+import unittest
+
+from satsearch.batch import AOIS_PROPERTY, BatchSearch, aoi_filename, read_aois, save_aois, split_aois
+from satsearch.geojson import open_items
+from satsearch.geometry import bbox_polygon
+
+from .stacserver import StacServer, TEMPLATES, synthetic_items
+
+testpath = os.path.dirname(__file__)
+
+
+def feature(bbox, **properties):
+    return {'type': 'Feature', 'properties': properties, 'geometry': bbox_polygon(bbox)}
+
+
+# AOIs overlapping Items 8 to 10
+AOIS = {'type': 'FeatureCollection', 'features': [
+    feature([0, 0, 10.2, 1], name='a'), feature([8.2, 0, 20.2, 1], name='b'), feature([100, 0, 101, 1], name='c')
+]}
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        # Items next to each other along the equator
+        self.items = synthetic_items(30, templates=TEMPLATES)
+        for i, item in enumerate(self.items):
+            item['bbox'] = [i, 0, i + 0.5, 0.5]
+            item['geometry'] = bbox_polygon(item['bbox'])
+
+    def test_read_aois(self):
+        """ Read named AOIs from GeoJSON """
+        self.assertEqual([name for name, g in read_aois(AOIS)], ['a', 'b', 'c'])
+        aois = read_aois({'type': 'FeatureCollection', 'features': [feature([0, 0, 1, 1]), feature([0, 0, 1, 1])]})
+        self.assertEqual([name for name, g in aois], ['aoi-0', 'aoi-1'])
+        aois = read_aois({'type': 'FeatureCollection', 'features': [feature([0, 0, 1, 1], id='x')] * 2})
+        self.assertEqual([name for name, g in aois], ['x', 'x-1'])
+        self.assertEqual(read_aois(bbox_polygon([0, 0, 1, 1])), [('aoi-0', bbox_polygon([0, 0, 1, 1]))])
+
+    def test_items(self):
+        """ Search AOIs concurrently, tagging Items with the AOIs they match """
+        with StacServer(items=self.items) as api:
+            search = BatchSearch(aois=read_aois(AOIS), url=api.url)
+            self.assertEqual(search.found(threads=2), [('a', None, 11), ('b', None, 13), ('c', None, 0)])
+            items = search.items(threads=2, page_limit=5)
+            collection_requests = [r for r in api.requests if r['path'].startswith('/collections')]
+        self.assertEqual(len(collection_requests), 2)
+        self.assertEqual(len(items), 21)
+        self.assertEqual(len(items._collections), 2)
+        aois = {i.id: i.properties[AOIS_PROPERTY] for i in items}
+        self.assertEqual(aois['item-0'], ['a'])
+        self.assertEqual(aois['item-9'], ['a', 'b'])
+        self.assertEqual(aois['item-20'], ['b'])
+
+    def test_items_fields(self):
+        """ Tag Items returned without properties """
+        with StacServer(items=self.items) as api:
+            search = BatchSearch(aois=read_aois(AOIS), url=api.url, fields={'include': ['id', 'collection']})
+            items = search.items(threads=2)
+        self.assertEqual(len(items), 21)
+        self.assertEqual({i.id: i.properties[AOIS_PROPERTY] for i in items}['item-9'], ['a', 'b'])
+
+    def test_items_datetimes(self):
+        """ Search several datetimes, sorting the combined results """
+        with StacServer(items=self.items) as api:
+            search = BatchSearch(datetimes=['2020-01-01T02:00:00Z/2020-01-01T04:00:00Z', '2020-01-01T03:00:00Z'],
+                                 sortby=['-datetime'], url=api.url)
+            items = search.items()
+        self.assertEqual([i.id for i in items], ['item-4', 'item-3', 'item-2'])
+        self.assertNotIn(AOIS_PROPERTY, items[0].properties)
+
+    def test_save_aois(self):
+        """ Save the Items of each AOI to a file """
+        self.assertEqual(aoi_filename('path/results.json.gz', 'farm 1'), 'path/results-farm_1.json.gz')
+        with StacServer(items=self.items) as api:
+            items = BatchSearch(aois=read_aois(AOIS), url=api.url).items()
+        self.assertEqual(sorted(split_aois(items).keys()), ['a', 'b'])
+        fname = os.path.join(testpath, 'test-batch.json')
+        filenames = save_aois(items, fname)
+        self.assertEqual(filenames, [aoi_filename(fname, 'a'), aoi_filename(fname, 'b')])
+        self.assertEqual(len(open_items(filenames[1])), 13)
+        for f in filenames:
+            os.remove(f)
@@ -0,0 +1,26 @@
+import unittest
+
+from .benchmark import benchmark, report
+
+
+class Test(unittest.TestCase):
+
+    def test_benchmark(self):
+        """ Run benchmark scenarios against the local API """
+        results = benchmark(nitems=1000, page_limit=100, scenarios=['found', 'items', 'items-get-links'])
+        self.assertEqual([r['scenario'] for r in results], ['found', 'items', 'items-get-links'])
+        # one request for the count, 10 pages plus 2 collections for the Items
+        self.assertEqual([r['requests'] for r in results], [1, 12, 12])
+        self.assertEqual([r['items'] for r in results], [1000, 1000, 1000])
+        self.assertIsNone(results[0]['items_per_second'])
+        self.assertTrue(results[1]['items_per_second'] > 0)
+        self.assertTrue(results[1]['peak_rss_mb'] > 0)
+        self.assertIn('items-get-links', report(results))
+
+    def test_benchmark_cli(self):
+        """ Run CLI scenarios, counting the Items saved """
+        results = benchmark(nitems=100, scenarios=['cli-found', 'cli-save'])
+        self.assertEqual([r['items'] for r in results], [None, 100])
+        self.assertIsNone(results[0]['items_per_second'])
+        self.assertTrue(results[1]['peak_rss_mb'] > 0)
+        self.assertIn('cli-found', report(results))
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import time
+import unittest
+
+from satsearch.cache import SQLiteCache
+from satsearch.search import Search
+
+from .stacserver import StacServer
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache = SQLiteCache.open(self.dir.name)
+
+    def tearDown(self):
+        self.cache.db.close()
+        self.dir.cleanup()
+
+    def test_key(self):
+        """ Key requests on canonical JSON body """
+        key = SQLiteCache.key('http://localhost/search', body={'a': 1, 'b': [1, 2]})
+        self.assertEqual(key, SQLiteCache.key('http://localhost/search', body={'b': [1, 2], 'a': 1}))
+        self.assertNotEqual(key, SQLiteCache.key('http://localhost/search', body={'a': 1, 'b': [2, 1]}))
+        self.assertNotEqual(key, SQLiteCache.key('http://localhost/search', body={'a': 1, 'b': [1, 2]},
+                                                 headers={'Authorization': 'token'}))
+
+    def test_get_set(self):
+        """ Get and set responses """
+        url = 'http://localhost/search'
+        self.assertIsNone(self.cache.get(url, body={'limit': 0}))
+        self.cache.set(url, b'{}', body={'limit': 0})
+        self.assertEqual(self.cache.get(url, body={'limit': 0}), b'{}')
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_ttl(self):
+        """ Expire responses by endpoint """
+        cache = SQLiteCache.open(self.dir.name, ttls={'search': 0.1})
+        cache.set('http://localhost/search', b'{}')
+        cache.set('http://localhost/collections/landsat-8-l1', b'{}')
+        time.sleep(0.2)
+        self.assertIsNone(cache.get('http://localhost/search'))
+        self.assertEqual(cache.get('http://localhost/collections/landsat-8-l1'), b'{}')
+
+    def test_evict(self):
+        """ Evict least recently used responses """
+        cache = SQLiteCache(os.path.join(self.dir.name, 'small.sqlite'), max_size=25)
+        for i in range(2):
+            cache.set('http://localhost/search', b'0123456789', body={'page': i})
+            time.sleep(0.01)
+        cache.get('http://localhost/search', body={'page': 0})
+        cache.set('http://localhost/search', b'0123456789', body={'page': 2})
+        self.assertIsNone(cache.get('http://localhost/search', body={'page': 1}))
+        self.assertIsNotNone(cache.get('http://localhost/search', body={'page': 0}))
+        self.assertIsNotNone(cache.get('http://localhost/search', body={'page': 2}))
+
+    def test_search_cache(self):
+        """ Use cached responses for repeated searches """
+        with StacServer(nitems=25) as api:
+            items = Search(url=api.url, cache=self.cache).items(page_limit=10)
+            nrequests = len(api.requests)
+            items2 = Search(url=api.url, cache=self.cache).items(page_limit=10)
+            self.assertEqual(len(api.requests), nrequests)
+            self.assertEqual([i.id for i in items], [i.id for i in items2])
+            self.assertEqual(self.cache.hits, nrequests)
@@ -4,8 +4,16 @@ import unittest
 from unittest.mock import patch
 import json
 import shutil
+import subprocess
+import tempfile
+import time
 
-from satsearch.cli import main, SatUtilsParser, cli
+from satsearch.cli import infer_fields, main, SatUtilsParser, cli
+from satsearch.version import __version__
+from satsearch.geojson import open_items
+from satstac import ItemCollection
+
+from .stacserver import StacServer
 
 
 testpath = os.path.dirname(__file__)
@@ -47,6 +55,14 @@ class Test(unittest.TestCase):
         #self.assertEqual(args['satellite_name'], 'Landsat-8')
         #self.assertEqual(args['dayOrNight'], 'DAY')
 
+    def test_parse_session_args(self):
+        """ Parse pooled session arguments """
+        parser = self.get_test_parser()
+        args = parser.parse_args('search --retries 5 --timeout 30 --pool-size 4'.split(' '))
+        self.assertEqual(args['retries'], 5)
+        self.assertEqual(args['timeout'], 30.0)
+        self.assertEqual(args['pool_size'], 4)
+
     def _test_parse_args_badcloud(self):
         parser = self.get_test_parser()
         with self.assertRaises(ValueError):
@@ -69,14 +85,14 @@ class Test(unittest.TestCase):
 
     def test_main_options(self):
         """ Test main program with output options """
-        fname = os.path.join(testpath, 'test_main-save.json')
-        items = main(datetime='2020-01-01', save=fname, printcal=True, printmd=[],
-                     collections=['sentinel-s2-l2a'], query=['eo:cloud_cover=0', 'data_coverage>80'])
-        min_items = 212
-        assert(len(items), min_items)
-        self.assertTrue(os.path.exists(fname))
-        os.remove(fname)
-        self.assertFalse(os.path.exists(fname))
+        # a failed search leaves partial results, so save to a temporary directory
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fname = os.path.join(tmpdir, 'test_main-save.json')
+            items = main(datetime='2020-01-01', save=fname, printcal=True, printmd=[],
+                         collections=['sentinel-s2-l2a'], query=['eo:cloud_cover=0', 'data_coverage>80'])
+            min_items = 212
+            assert(len(items), min_items)
+            self.assertTrue(os.path.exists(fname))
 
     def test_cli(self):
         """ Run CLI program """
@@ -100,3 +116,187 @@ class Test(unittest.TestCase):
             assert(os.path.exists(bname + '_thumbnail.jpg'))
             assert(os.path.exists(bname + '_info.json'))
         #shutil.rmtree(os.path.join(testpath,'landsat-8'))
+
+    def test_main_save_stream(self):
+        """ Save search results as they arrive """
+        with StacServer(nitems=25) as api, tempfile.TemporaryDirectory() as tmpdir:
+            fname = os.path.join(tmpdir, 'test_main-save.ndjson')
+            num = main(url=api.url, save=fname, ndjson=True)
+            self.assertEqual(num, 25)
+            self.assertEqual(len(open_items(fname)), 25)
+
+    def test_main_save_printmd(self):
+        """ Save search results and print metadata """
+        with StacServer(nitems=25) as api, tempfile.TemporaryDirectory() as tmpdir:
+            fname = os.path.join(tmpdir, 'test_main-save.json')
+            items = main(url=api.url, save=fname, printmd=[])
+            self.assertEqual(len(items), 25)
+            self.assertEqual(len(open_items(fname)), 25)
+
+    def test_main_sharded(self):
+        """ Run a sharded search """
+        with StacServer(nitems=100) as api:
+            items = main(url=api.url, datetime='2020-01-01/2020-01-04', datetime_shards=4, threads=2)
+        # all of 2020-01-04
+        self.assertEqual(len(items), 96)
+
+    def test_main_cache(self):
+        """ Use cached responses """
+        cache_dir = os.path.join(testpath, 'test-cache')
+        with StacServer(nitems=25) as api:
+            main(url=api.url, found=True, cache_dir=cache_dir)
+            self.assertEqual(main(url=api.url, found=True, cache_dir=cache_dir), 25)
+            self.assertEqual(len(api.requests), 1)
+            main(url=api.url, found=True, cache_dir=cache_dir, no_cache=True)
+            self.assertEqual(len(api.requests), 2)
+        shutil.rmtree(cache_dir)
+
+    def test_main_since(self):
+        """ Run an incremental search """
+        state = os.path.join(testpath, 'test_main-state.json')
+        with StacServer(nitems=10) as api:
+            self.assertEqual(len(main(url=api.url, since=state)), 10)
+            self.assertEqual(len(main(url=api.url, since=state)), 0)
+        self.assertEqual(len(main(items=state)), 0)
+        os.remove(state)
+
+    def test_main_stats(self):
+        """ Print statistics """
+        with StacServer(nitems=25) as api:
+            with patch('sys.stdout') as stdout:
+                main(url=api.url, stats=True)
+        output = ''.join([c.args[0] for c in stdout.write.call_args_list])
+        self.assertIn('Pages: 1, Items: 25', output)
+
+    def test_main_index(self):
+        """ Add search results to an index and load them with filters """
+        index = os.path.join(testpath, 'test_main-index.sqlite')
+        with StacServer(nitems=48) as api:
+            main(url=api.url, index=index)
+        items = main(items=[], index=index, datetime='2020-01-02', sortby=['-datetime'], limit=5)
+        self.assertEqual(items[0].id, 'item-47')
+        self.assertEqual(len(items), 5)
+        os.remove(index)
+
+    def test_main_load_filter(self):
+        """ Filter Items loaded from a file """
+        items = main(items=os.path.join(testpath, 'scenes.geojson'), query=['eo:cloud_cover<65'])
+        self.assertEqual([i.id for i in items], ['S2B_19TCH_20180209_0'])
+
+    def test_parse_load_args(self):
+        """ Parse arguments for load """
+        parser = self.get_test_parser()
+        args = parser.parse_args('load a.json b.json --datetime 2020-03 -q eo:cloud_cover<10'.split(' '))
+        self.assertEqual(args['items'], ['a.json', 'b.json'])
+        self.assertEqual(args['query'], ['eo:cloud_cover<10'])
+
+    def test_parse_aois(self):
+        """ Parse a FeatureCollection of AOIs to search """
+        fname = os.path.join(testpath, 'test_parse_aois.geojson')
+        aoi = {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 0], [1, 1], [0, 0]]]}
+        features = [{'type': 'Feature', 'id': fid, 'properties': {}, 'geometry': aoi} for fid in ['a', 'b']]
+        with open(fname, 'w') as f:
+            json.dump({'type': 'FeatureCollection', 'features': features}, f)
+        parser = self.get_test_parser()
+        args = parser.parse_args(['search', '--intersects', fname, '--datetimes', '2020-01', '2020-02'])
+        os.remove(fname)
+        self.assertNotIn('intersects', args)
+        self.assertEqual(args['aois'], [('a', aoi), ('b', aoi)])
+        self.assertEqual(args['datetimes'], ['2020-01', '2020-02'])
+        # saving per AOI needs more than one
+        with self.assertRaises(SystemExit):
+            parser.parse_args(['search', '--intersects', '{"type": "Point", "coordinates": [0, 0]}', '--per-aoi'])
+        with self.assertRaises(ValueError):
+            main(url='http://localhost', save='results.json', per_aoi=True)
+
+    def test_main_aois(self):
+        """ Search several AOIs, saving results for each """
+        aois = [('all', {'type': 'Polygon', 'coordinates': [[[-180, -90], [180, -90], [180, 90], [-180, 90], [-180, -90]]]}),
+                ('none', {'type': 'Point', 'coordinates': [0, 0]})]
+        fname = os.path.join(testpath, 'test_main-aois.json')
+        with StacServer(nitems=20) as api:
+            items = main(url=api.url, aois=aois, datetimes=['2020-01-01T00:00:00Z/2020-01-01T09:00:00Z'],
+                         save=fname, per_aoi=True, threads=2)
+        self.assertEqual(len(items), 10)
+        saved = os.path.join(testpath, 'test_main-aois-all.json')
+        self.assertEqual(len(open_items(saved)), 10)
+        self.assertFalse(os.path.exists(os.path.join(testpath, 'test_main-aois-none.json')))
+        os.remove(saved)
+
+    def test_import_time(self):
+        """ Import the CLI without the modules only needed to search """
+        for cmd in ['import satsearch.cli', 'import satsearch']:
+            out = subprocess.run([sys.executable, '-X', 'importtime', '-c', cmd], stderr=subprocess.PIPE,
+                                 universal_newlines=True, check=True).stderr
+            # lines of the form "import time: self [us] | cumulative | imported package"
+            modules = [line.split('|')[-1].strip() for line in out.splitlines()[1:]]
+            for module in ['requests', 'satstac', 'dateutil', 'satsearch.search']:
+                self.assertNotIn(module, modules)
+        out = subprocess.run([sys.executable, '-m', 'satsearch.cli', 'search', '--version'], stdout=subprocess.PIPE,
+                             universal_newlines=True, check=True).stdout
+        self.assertEqual(out.strip(), __version__)
+
+    def test_main_page_limit(self):
+        """ Search with a fixed or adaptive page size """
+        with StacServer(nitems=30) as api:
+            main(url=api.url, page_limit=10)
+            main(url=api.url, page_limit=5, min_page_limit=5, max_page_limit=20)
+            limits = [r['body']['limit'] for r in api.requests if r['path'] == '/search']
+        self.assertEqual(limits, [10, 10, 10, 5, 10, 20])
+
+    def test_main_rate_limit(self):
+        """ Search with a rate limit shared through a database """
+        db = os.path.join(testpath, 'test_main-ratelimit.sqlite')
+        with StacServer(nitems=30) as api:
+            start = time.time()
+            main(url=api.url, page_limit=10, rate_limit=10, rate_limit_db=db)
+            self.assertGreaterEqual(time.time() - start, 0.3)
+            self.assertEqual(len(api.requests), 4)
+        os.remove(db)
+
+    def test_main_ids_file(self):
+        """ Get Items for a file of ids, saving the ids not found """
+        fname = os.path.join(testpath, 'test_main-ids.txt')
+        missing = os.path.join(testpath, 'test_main-missing.txt')
+        with open(fname, 'w') as f:
+            f.write('item-4\nitem-1\n\nitem-42\n')
+        parser = self.get_test_parser()
+        args = parser.parse_args(['search', '--ids', 'item-2', '--ids-file', fname])
+        self.assertEqual(args['ids'], ['item-2', 'item-4', 'item-1', 'item-42'])
+        with StacServer(nitems=5) as api:
+            items = main(url=api.url, ids=args['ids'], id_chunk_size=2, missing_ids=missing)
+        self.assertEqual([i.id for i in items], ['item-2', 'item-4', 'item-1'])
+        with open(missing) as f:
+            self.assertEqual(f.read(), 'item-42\n')
+        os.remove(fname)
+        os.remove(missing)
+
+    def test_infer_fields(self):
+        """ Infer fields needed from outputs """
+        fields = infer_fields(printmd=['date', 'eo:cloud_cover'], printcal='platform')
+        self.assertEqual(fields['include'], ['id', 'type', 'collection', 'bbox', 'properties.datetime',
+                                             'properties.eo:cloud_cover', 'properties.platform'])
+        self.assertEqual(fields['exclude'], ['links', 'geometry', 'assets'])
+        fields = infer_fields(download=['thumbnail'], filename_template='${eo:platform}/${id}')
+        # all assets, as the key may be a band common name
+        self.assertIn('assets', fields['include'])
+        self.assertIn('properties.eo:platform', fields['include'])
+        self.assertNotIn('assets', fields['exclude'])
+        fields = infer_fields(printmd=['date'], sortby=['-eo:cloud_cover', 'properties.platform', 'id'])
+        self.assertEqual(fields['include'], ['id', 'type', 'collection', 'bbox', 'properties.datetime',
+                                             'properties.eo:cloud_cover', 'properties.platform'])
+
+    def test_main_fields(self):
+        """ Request only the fields printed unless saving results """
+        fname = os.path.join(testpath, 'test_main-fields.json')
+        with StacServer(nitems=5) as api:
+            items = main(url=api.url, printmd=['eo:cloud_cover'])
+            # Items, although printed from a table
+            self.assertTrue(isinstance(items, ItemCollection))
+            self.assertEqual(items.summary(['eo:cloud_cover']).count('-1'), 5)
+            main(url=api.url, printmd=['eo:cloud_cover'], save=fname)
+            searches = [r['body'] for r in api.requests if r['path'] == '/search']
+        self.assertIn('properties.eo:cloud_cover', searches[0]['fields']['include'])
+        self.assertNotIn('fields', searches[1])
+        self.assertIn('thumbnail', open_items(fname)[0].assets)
+        os.remove(fname)
@@ -0,0 +1,115 @@
+import hashlib
+import os
+import tempfile
+import unittest
+
+from satstac import Item
+from satsearch.download import Downloader, checksum_matches
+
+from .stacserver import StacServer, synthetic_items
+
+ASSETS = {
+    'B1.TIF': os.urandom(100000),
+    'B2.TIF': os.urandom(50000)
+}
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.template = os.path.join(self.dir.name, '${id}')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def get_items(self, url, n=3):
+        """ Items with assets served by the test server """
+        items = []
+        for item in synthetic_items(n):
+            item['assets'] = {
+                'B1': {'href': url + 'assets/B1.TIF', 'file:size': len(ASSETS['B1.TIF'])},
+                'B2': {'href': url + 'assets/B2.TIF',
+                       'file:checksum': '1220' + hashlib.sha256(ASSETS['B2.TIF']).hexdigest()}
+            }
+            items.append(Item(item))
+        return items
+
+    def test_checksum_matches(self):
+        """ Check multihash checksums """
+        fname = os.path.join(self.dir.name, 'test.bin')
+        with open(fname, 'wb') as f:
+            f.write(b'sat-search')
+        self.assertTrue(checksum_matches(fname, '1220' + hashlib.sha256(b'sat-search').hexdigest()))
+        self.assertTrue(checksum_matches(fname, 'd510' + hashlib.md5(b'sat-search').hexdigest()))
+        self.assertFalse(checksum_matches(fname, '1220' + hashlib.sha256(b'sat-stac').hexdigest()))
+        self.assertIsNone(checksum_matches(fname, '1114' + hashlib.sha1(b'sat-search').hexdigest()))
+
+    def test_download(self):
+        """ Download assets of all Items """
+        with StacServer(assets=ASSETS) as api:
+            downloader = Downloader(threads=4, chunk_size=4096)
+            fnames = downloader.download(self.get_items(api.url), ['B1', 'B2'], filename_template=self.template)
+        self.assertEqual(len(fnames), 6)
+        self.assertEqual(downloader.downloaded, 6)
+        self.assertEqual(downloader.nbytes, 3 * (len(ASSETS['B1.TIF']) + len(ASSETS['B2.TIF'])))
+        with open(os.path.join(self.dir.name, 'item-0_B1.TIF'), 'rb') as f:
+            self.assertEqual(f.read(), ASSETS['B1.TIF'])
+
+    def test_skip_complete(self):
+        """ Skip assets already downloaded """
+        with StacServer(assets=ASSETS) as api:
+            items = self.get_items(api.url)
+            Downloader().download(items, ['B1', 'B2'], filename_template=self.template)
+            nrequests = len(api.requests)
+            downloader = Downloader()
+            downloader.download(items, ['B1', 'B2'], filename_template=self.template)
+            self.assertEqual(downloader.skipped, 6)
+            self.assertEqual(len(api.requests), nrequests)
+            # checksum doesn't match
+            with open(os.path.join(self.dir.name, 'item-0_B2.TIF'), 'wb') as f:
+                f.write(b'corrupt')
+            downloader = Downloader()
+            downloader.download(items, ['B1', 'B2'], filename_template=self.template)
+            self.assertEqual((downloader.downloaded, downloader.skipped), (1, 5))
+
+    def test_skip_complete_head(self):
+        """ Skip assets without a size or checksum if the size matches the server's """
+        fname = os.path.join(self.dir.name, 'item-0_B1.TIF')
+        with StacServer(assets=ASSETS) as api:
+            items = self.get_items(api.url, n=1)
+            del items[0].assets['B1']['file:size']
+            with open(fname, 'wb') as f:
+                f.write(ASSETS['B1.TIF'])
+            downloader = Downloader(timeout=5)
+            self.assertEqual(downloader.session.timeout, 5)
+            downloader.download(items, ['B1'], filename_template=self.template)
+            self.assertEqual(downloader.skipped, 1)
+            self.assertEqual([r['method'] for r in api.requests], ['HEAD'])
+            # the server doesn't have it, so it can't be checked
+            items[0].assets['B1']['href'] = api.url + 'assets/missing.TIF'
+            downloader = Downloader()
+            downloader.download(items, ['B1'], filename_template=self.template)
+            self.assertEqual((downloader.skipped, downloader.failed), (0, 1))
+
+    def test_resume(self):
+        """ Resume an interrupted download """
+        fname = os.path.join(self.dir.name, 'item-0_B1.TIF')
+        with open(fname + '.part', 'wb') as f:
+            f.write(ASSETS['B1.TIF'][:60000])
+        with StacServer(assets=ASSETS) as api:
+            downloader = Downloader()
+            downloader.download(self.get_items(api.url, n=1), ['B1'], filename_template=self.template)
+            self.assertEqual(api.requests[0]['headers']['Range'], 'bytes=60000-')
+        self.assertEqual(downloader.nbytes, 40000)
+        self.assertFalse(os.path.exists(fname + '.part'))
+        with open(fname, 'rb') as f:
+            self.assertEqual(f.read(), ASSETS['B1.TIF'])
+
+    def test_download_failed(self):
+        """ Count failed downloads """
+        with StacServer(assets={}) as api:
+            downloader = Downloader()
+            fnames = downloader.download(self.get_items(api.url, n=1), ['B1'], filename_template=self.template)
+        self.assertEqual(fnames, [])
+        self.assertEqual(downloader.failed, 1)
@@ -0,0 +1,87 @@
+import os
+import json
+import tempfile
+import unittest
+
+from satstac import ItemCollection
+from satsearch import fastjson
+from satsearch.geojson import ItemWriter, LazyItemCollection, open_items, save_items
+
+testpath = os.path.dirname(__file__)
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.items = open_items(os.path.join(testpath, 'scenes.geojson'))
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_save_items(self):
+        """ Save Items as a FeatureCollection """
+        fname = os.path.join(self.dir.name, 'items.json')
+        self.assertEqual(save_items(self.items, fname, collections=self.items._collections), 2)
+        with open(fname) as f:
+            data = json.load(f)
+        self.assertEqual(data['type'], 'FeatureCollection')
+        self.assertEqual(len(data['features']), 2)
+        self.assertEqual(len(data['collections']), 2)
+        items = ItemCollection.open(fname)
+        self.assertEqual([i.id for i in items], [i.id for i in self.items])
+        self.assertEqual(os.listdir(self.dir.name), ['items.json'])
+
+    def test_save_permissions(self):
+        """ Save with the permissions of any new file """
+        fname = os.path.join(self.dir.name, 'items.json')
+        umask = os.umask(0o022)
+        try:
+            save_items(self.items, fname)
+        finally:
+            os.umask(umask)
+        self.assertEqual(os.stat(fname).st_mode & 0o777, 0o644)
+
+    def test_save_ndjson_gzip(self):
+        """ Save Items as gzipped newline delimited GeoJSON """
+        fname = os.path.join(self.dir.name, 'items.ndjson.gz')
+        save_items(self.items, fname, ndjson=True)
+        items = open_items(fname)
+        self.assertEqual([i.id for i in items], [i.id for i in self.items])
+
+    def test_save_empty(self):
+        """ Save no Items """
+        fname = os.path.join(self.dir.name, 'items.json')
+        self.assertEqual(save_items([], fname), 0)
+        self.assertEqual(len(open_items(fname)), 0)
+
+    def test_write_failure(self):
+        """ Keep partial results without creating the file if writing fails """
+        fname = os.path.join(self.dir.name, 'items.ndjson')
+        with self.assertRaises(RuntimeError):
+            with ItemWriter(fname, ndjson=True) as writer:
+                writer.write(self.items[0])
+                raise RuntimeError('connection lost')
+        self.assertFalse(os.path.exists(fname))
+        self.assertEqual(len(open_items(fname + '.partial')), 1)
+
+    def test_open_lazy(self):
+        """ Open Items that are decoded when accessed """
+        items = open_items(os.path.join(testpath, 'scenes.geojson'), lazy=True)
+        self.assertTrue(isinstance(items, LazyItemCollection))
+        self.assertEqual([i.id for i in items], [i.id for i in self.items])
+        self.assertEqual(len(items._collections), 2)
+        fname = os.path.join(self.dir.name, 'items.ndjson')
+        save_items(items, fname, ndjson=True)
+        items = open_items(fname, lazy=True)
+        self.assertEqual(items[1]._data, self.items[1]._data)
+
+    def test_json_backends(self):
+        """ Encode and decode JSON with each library """
+        backend = fastjson.backend
+        data = {'id': 'item', 'properties': {'eo:cloud_cover': 1.5, 'big': 2 ** 70}}
+        for name in fastjson.BACKENDS:
+            fastjson.use(name)
+            self.assertEqual(fastjson.loads(fastjson.dumps(data)), data)
+            self.assertEqual(fastjson.loads(fastjson.dumpb(data)), data)
+        fastjson.use(backend)
@@ -0,0 +1,64 @@
+import unittest
+
+from satsearch.geometry import Shape, bbox_polygon, convex_hull, envelope, segments_intersect, simplify
+
+
+# a square with a square hole
+SQUARE = {'type': 'Polygon', 'coordinates': [[[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]],
+                                             [[4, 4], [6, 4], [6, 6], [4, 6], [4, 4]]]}
+
+# an L shape
+ELL = {'type': 'Polygon', 'coordinates': [[[0, 0], [10, 0], [10, 2], [2, 2], [2, 10], [0, 10], [0, 0]]]}
+
+
+class Test(unittest.TestCase):
+
+    def test_envelope(self):
+        """ Get bbox of geometries """
+        self.assertEqual(envelope(ELL), [0, 0, 10, 10])
+        self.assertEqual(envelope({'type': 'Point', 'coordinates': [1, 2]}), [1, 2, 1, 2])
+        collection = {'type': 'GeometryCollection', 'geometries': [SQUARE, {'type': 'Point', 'coordinates': [20, -1]}]}
+        self.assertEqual(envelope(collection), [0, -1, 20, 10])
+
+    def test_convex_hull(self):
+        """ Get convex hull of a geometry """
+        hull = convex_hull(ELL)
+        self.assertEqual(hull['coordinates'][0], [[0, 0], [10, 0], [10, 2], [2, 10], [0, 10], [0, 0]])
+        line = {'type': 'LineString', 'coordinates': [[0, 0], [1, 1]]}
+        self.assertEqual(convex_hull(line), bbox_polygon([0, 0, 1, 1]))
+
+    def test_simplify(self):
+        """ Simplify a geometry to an envelope containing it """
+        self.assertEqual(simplify(ELL), bbox_polygon([0, 0, 10, 10]))
+        self.assertEqual(simplify(ELL, 'hull'), convex_hull(ELL))
+        with self.assertRaises(ValueError):
+            simplify(ELL, 'circle')
+
+    def test_segments_intersect(self):
+        """ Check if segments cross or touch """
+        self.assertTrue(segments_intersect((0, 0, 2, 2), (0, 2, 2, 0)))
+        self.assertTrue(segments_intersect((0, 0, 2, 0), (2, 0, 3, 1)))
+        self.assertFalse(segments_intersect((0, 0, 1, 1), (2, 2, 3, 3)))
+        self.assertFalse(segments_intersect((0, 0, 2, 0), (0, 1, 2, 1)))
+
+    def test_intersects(self):
+        """ Check if geometries intersect a Shape """
+        shape = Shape(SQUARE, grid=4)
+        # crossing, inside, containing, touching
+        self.assertTrue(shape.intersects(bbox_polygon([-1, -1, 1, 1])))
+        self.assertTrue(shape.intersects(bbox_polygon([1, 1, 2, 2])))
+        self.assertTrue(shape.intersects(bbox_polygon([-1, -1, 11, 11])))
+        self.assertTrue(shape.intersects(bbox_polygon([10, 10, 11, 11])))
+        # in the hole, outside
+        self.assertFalse(shape.intersects(bbox_polygon([4.5, 4.5, 5.5, 5.5])))
+        self.assertFalse(shape.intersects(bbox_polygon([11, 11, 12, 12])))
+        self.assertFalse(shape.intersects(None))
+
+    def test_intersects_concave(self):
+        """ Check geometries in the bbox of a concave Shape """
+        shape = Shape(ELL)
+        self.assertFalse(shape.intersects(bbox_polygon([5, 5, 8, 8])))
+        self.assertTrue(shape.intersects({'type': 'Point', 'coordinates': [1, 9]}))
+        self.assertFalse(shape.intersects({'type': 'Point', 'coordinates': [9, 9]}))
+        self.assertTrue(shape.intersects({'type': 'LineString', 'coordinates': [[9, 9], [9, 1]]}))
+        self.assertFalse(Shape({'type': 'LineString', 'coordinates': [[0, 0], [1, 1]]}).contains_point([0.5, 0]))
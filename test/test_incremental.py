@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+
+from satsearch.geojson import open_items
+from satsearch.incremental import incremental_items, narrow, read_watermark
+
+from .stacserver import StacServer, synthetic_items
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.state = os.path.join(self.dir.name, 'state.json')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_narrow(self):
+        """ Narrow search parameters to after a watermark """
+        wm = {'field': 'datetime', 'value': '2020-01-01T05:00:00Z', 'ids': ['item-5']}
+        self.assertEqual(narrow({}, wm), {'datetime': '2020-01-01T05:00:00Z/..', 'sortby': ['properties.datetime']})
+        self.assertEqual(narrow({'sortby': ['-datetime']}, None, field='updated')['sortby'], ['properties.updated'])
+        self.assertEqual(narrow({'datetime': '2019-01-01/2021-01-01'}, wm)['datetime'], '2020-01-01T05:00:00Z/2021-01-01')
+        self.assertEqual(narrow({'datetime': '2020-06-01/2021-01-01'}, wm)['datetime'], '2020-06-01/2021-01-01')
+        wm['field'] = 'updated'
+        self.assertEqual(narrow({'query': ['eo:cloud_cover<10']}, wm)['query'],
+                         ['eo:cloud_cover<10', 'updated>=2020-01-01T05:00:00Z'])
+        self.assertEqual(narrow({'query': {'eo:cloud_cover': {'lt': 10}}}, wm)['query'],
+                         {'eo:cloud_cover': {'lt': 10}, 'updated': {'gte': '2020-01-01T05:00:00Z'}})
+
+    def test_incremental_items(self):
+        """ Return only new Items on each run """
+        with StacServer(nitems=10) as api:
+            items = incremental_items(self.state, url=api.url)
+            self.assertEqual(len(items), 10)
+            self.assertEqual(read_watermark(self.state)['ids'], ['item-9'])
+            self.assertEqual(len(open_items(self.state)), 10)
+
+            # a new item with the same datetime as the watermark, and 2 later items
+            new = synthetic_items(12)[9:]
+            new[0]['id'] = 'item-9b'
+            api.items += new
+            items = incremental_items(self.state, url=api.url)
+            self.assertEqual([i.id for i in items], ['item-9b', 'item-10', 'item-11'])
+            self.assertEqual(read_watermark(self.state)['value'], '2020-01-01T11:00:00Z')
+            searches = [r for r in api.requests if r['path'] == '/search']
+            self.assertEqual(searches[-1]['body']['datetime'], '2020-01-01T09:00:00Z/..')
+
+            self.assertEqual(len(incremental_items(self.state, url=api.url)), 0)
+            self.assertEqual(read_watermark(self.state)['ids'], ['item-11'])
+
+    def test_incremental_items_limit(self):
+        """ Find the rest of the new Items on the next run when there are more than the limit """
+        with StacServer(nitems=10) as api:
+            incremental_items(self.state, url=api.url)
+            api.items += synthetic_items(30)[10:]
+            ids = []
+            for i in range(5):
+                ids += [i.id for i in incremental_items(self.state, url=api.url, sortby=['-datetime'], limit=5)]
+        self.assertEqual(ids, ['item-%s' % i for i in range(10, 30)])
@@ -0,0 +1,84 @@
+import os
+import unittest
+
+from satstac import Collection, Item
+from satsearch.geojson import open_items
+from satsearch.index import Index, timestamp
+from satsearch.search import parse_query, parse_sortby
+
+from .stacserver import collections, synthetic_items, TEMPLATES
+
+testpath = os.path.dirname(__file__)
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.index = Index()
+        # Items one hour apart from 2020-01-01, two Landsat for every Sentinel
+        self.items = [Item(i) for i in synthetic_items(48, templates=TEMPLATES)]
+        self.index.add(self.items, collections=[Collection(c) for c in collections().values()])
+
+    def test_timestamp(self):
+        """ Normalize datetimes and partial dates """
+        self.assertEqual(timestamp('2018-02-09T10:35:49-05:00'), '2018-02-09T15:35:49.000000')
+        self.assertEqual(timestamp('2018-03'), '2018-03-01T00:00:00.000000')
+        self.assertEqual(timestamp('2018-03', end=True), '2018-03-31T23:59:59.999999')
+
+    def test_add(self):
+        """ Add Items, replacing those with the same id """
+        self.assertEqual(len(self.index), 48)
+        self.index.add(self.items[0:10])
+        self.assertEqual(len(self.index), 48)
+        items = open_items(os.path.join(testpath, 'scenes.geojson'))
+        self.index.add(items, collections=items._collections)
+        self.assertEqual(len(self.index), 50)
+
+    def test_search(self):
+        """ Search all Items in insertion order """
+        items = self.index.search()
+        self.assertEqual([i.id for i in items], [i.id for i in self.items])
+        self.assertEqual(len(self.index.search(limit=5)), 5)
+
+    def test_search_ids(self):
+        """ Search by ids, ignoring other filters """
+        items = self.index.search(ids=['item-1', 'item-2'], collections=['none'])
+        self.assertEqual([i.id for i in items], ['item-1', 'item-2'])
+
+    def test_search_collections(self):
+        """ Search by collection, returning the Collections """
+        items = self.index.search(collections=['sentinel-2-l1c'])
+        self.assertEqual(len(items), 16)
+        self.assertEqual([c.id for c in items._collections], ['sentinel-2-l1c'])
+
+    def test_search_datetime(self):
+        """ Search by datetime interval """
+        self.assertEqual(len(self.index.search(datetime='2020-01-01')), 24)
+        self.assertEqual(len(self.index.search(datetime='2020-01-01T12:00:00Z/..')), 36)
+        self.assertEqual(len(self.index.search(datetime='2020-01-01T11:30:00+02:00/2020-01-01T12:00:00Z')), 3)
+
+    def test_search_bbox(self):
+        """ Search by bbox and intersects """
+        bbox = self.items[0].bbox
+        items = self.index.search(bbox=bbox)
+        self.assertTrue(0 < len(items) < 48)
+        self.assertIn(self.items[0].id, [i.id for i in items])
+        geom = {'type': 'Polygon', 'coordinates': [[[bbox[0], bbox[1]], [bbox[2], bbox[1]], [bbox[2], bbox[3]],
+                                                    [bbox[0], bbox[1]]]]}
+        self.assertEqual(len(self.index.search(intersects=geom)), len(items))
+        self.assertEqual(len(self.index.search(bbox=[0, 0, 0.1, 0.1])), 0)
+
+    def test_search_query(self):
+        """ Search by properties """
+        cloud_cover = sorted(set([i.properties['eo:cloud_cover'] for i in self.items]))
+        items = self.index.search(query=parse_query(['eo:cloud_cover<=%s' % cloud_cover[0]]))
+        self.assertEqual(set([i.properties['eo:cloud_cover'] for i in items]), set([cloud_cover[0]]))
+        items = self.index.search(query={'collection': {'neq': 'landsat-8-l1'}})
+        self.assertEqual(len(items), 16)
+
+    def test_search_sortby(self):
+        """ Sort Items by datetime and properties """
+        items = self.index.search(sortby=parse_sortby(['-datetime']), limit=3)
+        self.assertEqual([i.id for i in items], ['item-47', 'item-46', 'item-45'])
+        items = self.index.search(sortby=parse_sortby(['collection', '-id']))
+        self.assertEqual(items[0].id, 'item-9')
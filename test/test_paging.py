@@ -0,0 +1,59 @@
+import unittest
+
+from satsearch.paging import PageSizer
+
+
+class Test(unittest.TestCase):
+
+    def test_fixed(self):
+        """ Keep the same page size with equal bounds """
+        sizer = PageSizer(min_size=100, max_size=100)
+        self.assertFalse(sizer.adaptive)
+        self.assertEqual(sizer.start(500), 100)
+        self.assertEqual(sizer.update(100, 100, 1000, 0.01), 100)
+        self.assertFalse(sizer.failed())
+
+    def test_grow(self):
+        """ Grow the page size when responses are fast, up to the maximum """
+        sizer = PageSizer(size=100, max_size=300)
+        self.assertEqual(sizer.update(100, 100, 1000, 0.1), 200)
+        self.assertEqual(sizer.update(200, 200, 2000, 0.1), 300)
+
+    def test_shrink(self):
+        """ Shrink the page size when responses are slow, down to the minimum """
+        sizer = PageSizer(size=1000, target=2.0)
+        self.assertEqual(sizer.update(1000, 1000, 1000, 8.0), 250)
+        self.assertEqual(sizer.update(250, 250, 1000, 100.0), 10)
+
+    def test_max_bytes(self):
+        """ Keep pages under a number of bytes """
+        sizer = PageSizer(size=100, max_bytes=1e6)
+        self.assertEqual(sizer.update(100, 100, 1e6, 0.1), 100)
+
+    def test_failed(self):
+        """ Halve the page size after a failed request """
+        sizer = PageSizer(size=40, min_size=10)
+        self.assertTrue(sizer.failed())
+        self.assertEqual(sizer.size, 20)
+        self.assertTrue(sizer.failed())
+        self.assertFalse(sizer.failed())
+        self.assertEqual(sizer.size, 10)
+
+    def test_server_max(self):
+        """ Don't request more Items than the API returns per page """
+        sizer = PageSizer(size=500)
+        self.assertEqual(sizer.update(500, 250, 1000, 0.1), 250)
+        self.assertEqual(sizer.server_max, 250)
+        # the last page has fewer Items
+        sizer = PageSizer(size=500)
+        sizer.update(500, 250, 1000, 0.1, last=True)
+        self.assertIsNone(sizer.server_max)
+
+    def test_copy(self):
+        """ Copy the bounds for another search, sized independently """
+        sizer = PageSizer(size=500, min_size=20, max_size=1000)
+        sizer.update(500, 250, 1000, 0.1)
+        copy = sizer.copy()
+        self.assertEqual((copy.size, copy.min_size, copy.max_size, copy.server_max), (250, 20, 1000, 250))
+        copy.failed()
+        self.assertEqual((copy.size, sizer.size), (125, 250))
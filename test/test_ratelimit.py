@@ -0,0 +1,67 @@
+import os
+import time
+import unittest
+
+from concurrent.futures import ThreadPoolExecutor
+from satsearch.ratelimit import RateLimiter, SQLiteRateLimiter
+from satsearch.search import Search
+from satsearch.session import Session
+
+from .stacserver import StacServer
+
+testpath = os.path.dirname(__file__)
+
+
+def timed(func, *args):
+    start = time.time()
+    func(*args)
+    return time.time() - start
+
+
+class Test(unittest.TestCase):
+
+    def tearDown(self):
+        fname = os.path.join(testpath, 'test-ratelimit.sqlite')
+        if os.path.exists(fname):
+            os.remove(fname)
+
+    def test_rate(self):
+        """ Limit the rate of requests """
+        limiter = RateLimiter(20)
+        self.assertGreaterEqual(timed(lambda: [limiter.acquire() for i in range(5)]), 0.19)
+        self.assertGreater(limiter.waited, 0)
+        with self.assertRaises(ValueError):
+            RateLimiter(0)
+
+    def test_burst(self):
+        """ Allow a burst of requests """
+        limiter = RateLimiter(1, burst=5)
+        self.assertLess(timed(lambda: [limiter.acquire() for i in range(5)]), 0.5)
+        self.assertGreaterEqual(timed(limiter.acquire), 0.9)
+
+    def test_pause(self):
+        """ Pause requests """
+        limiter = RateLimiter(100, burst=10)
+        limiter.pause(0.3)
+        self.assertGreaterEqual(timed(limiter.acquire), 0.25)
+        self.assertLess(timed(limiter.acquire), 0.05)
+        self.assertEqual(limiter.pauses, 1)
+
+    def test_sqlite(self):
+        """ Share a rate limit between limiters using the same database """
+        fname = os.path.join(testpath, 'test-ratelimit.sqlite')
+        limiters = [SQLiteRateLimiter(fname, 20, name='test') for i in range(2)]
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            elapsed = timed(lambda: list(executor.map(lambda l: [l.acquire() for i in range(5)], limiters)))
+        self.assertGreaterEqual(elapsed, 0.4)
+        limiters[0].pause(0.5)
+        self.assertGreaterEqual(timed(limiters[1].acquire), 0.4)
+
+    def test_session(self):
+        """ Pause a rate limiter when the API responds 429 """
+        limiter = RateLimiter(50)
+        with StacServer(nitems=5, errors=[429], retry_after=1) as api:
+            search = Search(url=api.url, session=Session(retries=1, backoff_factor=0, rate_limiter=limiter))
+            self.assertGreaterEqual(timed(search.found), 1)
+            self.assertEqual(len(api.requests), 2)
+        self.assertEqual(limiter.pauses, 1)
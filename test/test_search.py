@@ -1,10 +1,15 @@
 import os
 import glob
 import json
+import types
 import unittest
 
 from satstac import Item
-from satsearch.search import SatSearchError, Search
+from satsearch.search import SatSearchError, Search, parse_fields, split_bbox, split_datetime
+from satsearch.geometry import bbox_polygon
+from satsearch.paging import PageSizer
+
+from .stacserver import StacServer, synthetic_items
 
 API_URL = 'https://earth-search.aws.element84.com/v0'
 
@@ -82,3 +87,207 @@ class Test(unittest.TestCase):
         instance = Search.search(collections=['sentinel-s2-l1c'],
                                  query=['eo:cloud_cover<=10', 'data_coverage>80'])
         assert instance.kwargs == expected
+
+    def test_iter_items(self):
+        """ Stream Items page by page """
+        with StacServer(nitems=25) as api:
+            search = Search(url=api.url)
+            items = search.iter_items(page_limit=10)
+            self.assertTrue(isinstance(items, types.GeneratorType))
+            item = next(items)
+            self.assertTrue(isinstance(item, Item))
+            self.assertEqual(item.collection().id, 'landsat-8-l1')
+            # only the first page and the collection have been requested so far
+            self.assertEqual(len(api.requests), 2)
+            self.assertEqual(len(list(items)), 24)
+            collection_requests = [r for r in api.requests if r['path'].startswith('/collections')]
+            self.assertEqual(len(collection_requests), 1)
+
+    def test_items_stream(self):
+        """ Return a generator of Items from items() """
+        with StacServer(nitems=25) as api:
+            items = Search(url=api.url).items(page_limit=10, stream=True)
+            self.assertEqual(len([i.id for i in items]), 25)
+
+    def test_items_lazy(self):
+        """ Return Items that are decoded when accessed """
+        with StacServer(nitems=25) as api:
+            items = Search(url=api.url).items(page_limit=10, lazy=True)
+        self.assertEqual(len(items), 25)
+        self.assertEqual([i.id for i in items][0:2], ['item-0', 'item-1'])
+        self.assertEqual(items[3].collection().id, 'landsat-8-l1')
+
+    def test_items_collections(self):
+        """ Return Items along with their Collections """
+        with StacServer(nitems=25) as api:
+            items = Search(url=api.url).items(page_limit=10)
+            self.assertEqual(len(items), 25)
+            self.assertEqual(len(items._collections), 1)
+            self.assertEqual(items[0].collection().id, 'landsat-8-l1')
+
+    def test_split_datetime(self):
+        """ Split a datetime interval into shards """
+        dts = split_datetime('2020-01-01T00:00:00Z/2020-01-05T00:00:00Z', 4)
+        self.assertEqual(dts, ['2020-01-01T00:00:00Z/2020-01-02T00:00:00Z', '2020-01-02T00:00:00Z/2020-01-03T00:00:00Z',
+                               '2020-01-03T00:00:00Z/2020-01-04T00:00:00Z', '2020-01-04T00:00:00Z/2020-01-05T00:00:00Z'])
+        # partial dates cover the whole period, whatever the date today
+        dts = split_datetime('2021/2022', 2)
+        self.assertEqual(dts, ['2021/2022-01-01T00:00:00Z', '2022-01-01T00:00:00Z/2022-12-31T23:59:59.999999Z'])
+        dts = split_datetime('2020-01-01/2020-01-04', 4)
+        self.assertEqual(dts[0], '2020-01-01/2020-01-02T00:00:00Z')
+        self.assertEqual(dts[3], '2020-01-04T00:00:00Z/2020-01-04T23:59:59.999999Z')
+        self.assertEqual(split_datetime('2020-01-01/..', 4), ['2020-01-01/..'])
+
+    def test_split_bbox(self):
+        """ Split a bbox into tiles """
+        bboxes = split_bbox(['0', '0', '10', '20'], 2)
+        self.assertEqual(bboxes, [[0, 0, 5, 10], [5, 0, 10, 10], [0, 10, 5, 20], [5, 10, 10, 20]])
+
+    def test_sharded_items(self):
+        """ Search shards concurrently, removing duplicates """
+        with StacServer(nitems=100) as api:
+            search = Search.search(url=api.url, datetime='2020-01-01/2020-01-04', sortby=['-datetime'],
+                                   bbox=[-180, -90, 180, 90])
+            items = search.sharded_items(datetime_shards=3, bbox_shards=2, threads=4, page_limit=10)
+            self.assertEqual(len(search.shards(datetime_shards=3, bbox_shards=2)), 12)
+            # the same as without shards, all of 2020-01-04
+            self.assertEqual(len(items), search.found())
+            self.assertEqual(len(items), 96)
+            self.assertEqual(items[0].id, 'item-95')
+            self.assertEqual(items[95].id, 'item-0')
+            items = search.sharded_items(datetime_shards=3, limit=5)
+            self.assertEqual([i.id for i in items], ['item-95', 'item-94', 'item-93', 'item-92', 'item-91'])
+
+    def test_shards_page_sizer(self):
+        """ Give each shard its own page sizer """
+        sizer = PageSizer(size=50, min_size=10, max_size=100)
+        search = Search(url='http://localhost/', page_sizer=sizer, datetime='2020-01-01/2020-01-03')
+        shards = search.shards(datetime_shards=2)
+        self.assertEqual(len(set(id(s.page_sizer) for s in shards + [search])), 3)
+        self.assertEqual([(s.page_sizer.size, s.page_sizer.max_size) for s in shards], [(50, 100), (50, 100)])
+
+    def test_found_limit(self):
+        """ Request no Items to determine number found, even with a limit """
+        with StacServer(nitems=25) as api:
+            self.assertEqual(Search(url=api.url, limit=5).found(), 25)
+            self.assertEqual(api.requests[0]['body']['limit'], 0)
+
+    def test_items_no_found(self):
+        """ Get Items without a separate request for the number found """
+        with StacServer(nitems=25) as api:
+            with self.assertLogs('satsearch.search', level='WARNING'):
+                items = Search(url=api.url).items(limit=20, page_limit=10)
+            self.assertEqual(len(items), 20)
+            searches = [r['body'] for r in api.requests if r['path'] == '/search']
+            self.assertEqual([s['limit'] for s in searches], [10, 10])
+
+    def test_items_limit(self):
+        """ Stop paging exactly at the limit """
+        with StacServer(nitems=25) as api:
+            items = Search(url=api.url, limit=13).items(page_limit=10)
+            self.assertEqual(len(items), 13)
+            searches = [r['body'] for r in api.requests if r['path'] == '/search']
+            self.assertEqual([s['limit'] for s in searches], [10, 3])
+
+    def test_items_trim(self):
+        """ Trim the last page to the limit when the API ignores the page limit """
+        with StacServer(nitems=25, page_size=10) as api:
+            items = Search(url=api.url).items(limit=13, page_limit=10)
+            self.assertEqual([i.id for i in items], ['item-%s' % i for i in range(13)])
+
+    def test_items_envelope(self):
+        """ Search with the envelope of intersects, returning only Items intersecting it """
+        items = synthetic_items(20)
+        for i, item in enumerate(items):
+            item['bbox'] = [i, 0, i + 0.5, 0.5]
+            item['geometry'] = bbox_polygon(item['bbox'])
+        aoi = {'type': 'MultiPolygon', 'coordinates': [bbox_polygon([2.2, 0.2, 2.8, 0.8])['coordinates'],
+                                                       bbox_polygon([15, 0, 15.2, 1])['coordinates']]}
+        with StacServer(items=items) as api:
+            exact = Search(url=api.url, intersects=aoi).items(page_limit=5)
+            search = Search(url=api.url, intersects=aoi, envelope='bbox')
+            self.assertEqual(search.found(), 14)
+            items = search.items(page_limit=5)
+            searches = [r['body'] for r in api.requests if r['path'] == '/search']
+            self.assertEqual(searches[-1]['intersects'], bbox_polygon([2.2, 0, 15.2, 1]))
+        self.assertEqual([i.id for i in items], ['item-2', 'item-15'])
+        self.assertEqual([i.id for i in items], [i.id for i in exact])
+
+    def test_items_page_sizer(self):
+        """ Adapt the page size, not requesting more than the API returns """
+        with StacServer(nitems=200, page_size=25) as api:
+            sizer = PageSizer(size=10, max_size=100)
+            items = Search(url=api.url, page_sizer=sizer).items()
+            self.assertEqual(len(items), 200)
+            searches = [r['body'] for r in api.requests if r['path'] == '/search']
+            self.assertEqual([s['limit'] for s in searches][0:4], [10, 20, 40, 25])
+            self.assertEqual(sizer.server_max, 25)
+
+    def test_items_page_sizer_errors(self):
+        """ Request fewer Items after a failed request """
+        with StacServer(nitems=25, errors=[503, 503]) as api:
+            items = Search(url=api.url, page_sizer=PageSizer(min_size=5)).items(page_limit=20)
+            self.assertEqual(len(items), 25)
+            searches = [r['body'] for r in api.requests if r['path'] == '/search']
+            self.assertEqual([s['limit'] for s in searches][0:3], [20, 10, 5])
+        with StacServer(nitems=25, errors=[503, 503]) as api:
+            with self.assertRaises(SatSearchError):
+                Search(url=api.url).items(page_limit=20)
+
+    def test_items_by_id(self):
+        """ Get Items by id in chunks, in the order of the ids """
+        ids = ['item-%s' % i for i in [7, 3, 21, 0, 99, 14, 3]]
+        with StacServer(nitems=25) as api:
+            search = Search(url=api.url, ids=ids)
+            self.assertEqual([len(s.kwargs['ids']) for s in search.id_chunks(chunk_size=3)], [3, 3, 1])
+            items = search.items_by_id(chunk_size=3, threads=2)
+            searches = [r['body'] for r in api.requests if r['path'] == '/search']
+        self.assertEqual(sorted([len(s['ids']) for s in searches]), [1, 3, 3])
+        self.assertEqual([i.id for i in items], ['item-7', 'item-3', 'item-21', 'item-0', 'item-14'])
+        self.assertEqual(search.missing_ids, ['item-99'])
+        self.assertEqual(items[0].collection().id, 'landsat-8-l1')
+
+    def test_items_by_id_direct(self):
+        """ Get Items not found by searching from their Collection """
+        ids = ['item-%s' % i for i in range(10)]
+        with StacServer(nitems=10, unindexed=['item-2', 'item-5']) as api:
+            search = Search(url=api.url, ids=ids + ['item-99'], collections=['sentinel-2-l1c', 'landsat-8-l1'])
+            items = search.items_by_id(chunk_size=4, direct=True)
+            gets = [r['path'] for r in api.requests if r['method'] == 'GET']
+        self.assertEqual([i.id for i in items], ids)
+        self.assertEqual(search.missing_ids, ['item-99'])
+        self.assertIn('/collections/landsat-8-l1/items/item-2', gets)
+        self.assertEqual(len(gets), 6)
+
+    def test_parse_fields(self):
+        """ Convert a list of fields to a STAC fields object """
+        fields = parse_fields(['id', '+properties.datetime', '-links'])
+        self.assertEqual(fields, {'include': ['id', 'properties.datetime'], 'exclude': ['links']})
+
+    def test_items_fields(self):
+        """ Get only some fields of Items """
+        with StacServer(nitems=25) as api:
+            search = Search.search(url=api.url, fields=['id', 'collection', 'properties.eo:cloud_cover', '-links'])
+            items = search.items(page_limit=10)
+            self.assertEqual(api.requests[0]['body']['fields']['exclude'], ['links'])
+        self.assertEqual(len(items), 25)
+        self.assertEqual(sorted(items[0]._data.keys()), ['collection', 'id', 'links', 'properties'])
+        self.assertEqual(list(items[0].properties.keys()), ['eo:cloud_cover'])
+        self.assertEqual(items[0].collection().id, 'landsat-8-l1')
+
+    def test_items_fields_unsupported(self):
+        """ Get complete Items from an API without the fields extension """
+        with StacServer(nitems=25, fields=False) as api:
+            search = Search(url=api.url, fields={'include': ['id']})
+            with self.assertLogs('satsearch.search', level='WARNING'):
+                items = search.items(page_limit=10)
+            searches = [r['body'] for r in api.requests if r['path'] == '/search']
+        self.assertEqual(len(items), 25)
+        self.assertIn('assets', items[0]._data)
+        self.assertEqual(['fields' in s for s in searches], [True, False, False, False])
+
+    def test_envelope_fields(self):
+        """ Include geometry in fields when checking Items against an AOI """
+        search = Search(url='https://localhost', intersects=bbox_polygon([0, 0, 1, 1]), envelope='bbox',
+                        fields={'include': ['id'], 'exclude': ['geometry', 'links']})
+        self.assertEqual(search.kwargs['fields'], {'include': ['id', 'geometry'], 'exclude': ['links']})
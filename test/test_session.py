@@ -0,0 +1,40 @@
+import time
+import unittest
+
+from satsearch.search import SatSearchError, Search
+from satsearch.session import Session
+
+from .stacserver import StacServer
+
+
+class Test(unittest.TestCase):
+
+    def test_session_search(self):
+        """ Search using a pooled session """
+        with StacServer(nitems=25) as api:
+            search = Search(url=api.url, session=Session(pool_size=2))
+            self.assertEqual(search.found(), 25)
+            self.assertEqual(len(search.items(page_limit=10)), 25)
+
+    def test_retries(self):
+        """ Retry requests that fail with a 5xx error """
+        with StacServer(nitems=5, errors=[502, 503]) as api:
+            search = Search(url=api.url, session=Session(retries=2, backoff_factor=0))
+            self.assertEqual(search.found(), 5)
+            self.assertEqual(len(api.requests), 3)
+
+    def test_retries_exhausted(self):
+        """ Raise SatSearchError when out of retries """
+        with StacServer(nitems=5, errors=[502, 502, 502]) as api:
+            search = Search(url=api.url, session=Session(retries=1, backoff_factor=0))
+            with self.assertRaises(SatSearchError):
+                search.found()
+            self.assertEqual(len(api.requests), 2)
+
+    def test_retry_after(self):
+        """ Wait for Retry-After when rate limited """
+        with StacServer(nitems=5, errors=[429], retry_after=1) as api:
+            search = Search(url=api.url, session=Session(retries=1, backoff_factor=0))
+            t = time.time()
+            self.assertEqual(search.found(), 5)
+            self.assertGreaterEqual(time.time() - t, 1)
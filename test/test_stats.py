@@ -0,0 +1,31 @@
+import unittest
+
+from satsearch.search import Search
+from satsearch.stats import Stats
+
+from .stacserver import StacServer
+
+
+class Test(unittest.TestCase):
+
+    def test_hooks(self):
+        """ Call hooks with events """
+        events = []
+        with StacServer(nitems=25) as api:
+            Search(url=api.url, hooks=[lambda event, **info: events.append((event, info))]).items(page_limit=10)
+        self.assertEqual([e[0] for e in events if e[0] != 'request'],
+                         ['page', 'items', 'collection', 'page', 'items', 'page', 'items'])
+        requests = [e[1] for e in events if e[0] == 'request']
+        self.assertEqual(len(requests), 4)
+        self.assertEqual(requests[0]['status'], 200)
+        self.assertTrue(requests[0]['nbytes'] > 0)
+
+    def test_stats(self):
+        """ Accumulate statistics """
+        stats = Stats()
+        with StacServer(nitems=25) as api:
+            Search(url=api.url, hooks=[stats]).items(page_limit=10)
+        self.assertEqual((stats.requests, stats.pages, stats.nitems, stats.collections), (4, 3, 25, 1))
+        report = stats.report()
+        self.assertIn('Requests: 4 (0 cached, 0 errors)', report)
+        self.assertIn('Pages: 3, Items: 25', report)
@@ -0,0 +1,102 @@
+import os
+import unittest
+
+from satstac import Collection, Item, ItemCollection
+from satsearch.search import SatSearchError, Search
+from satsearch.table import Column, ItemTable
+
+from .stacserver import StacServer, collections, synthetic_items, TEMPLATES
+
+testpath = os.path.dirname(__file__)
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.items = ItemCollection([Item(i) for i in synthetic_items(48, templates=TEMPLATES)],
+                                    collections=[Collection(c) for c in collections().values()])
+        self.table = ItemTable(collections=self.items._collections)
+        self.table.extend(self.items)
+
+    def test_column(self):
+        """ Keep values in typed arrays where possible """
+        column = Column()
+        for v in [None, 1, 2]:
+            column.append(v)
+        self.assertEqual(column.kind, 'int')
+        # ints stay ints among floats
+        column.append(2.5)
+        self.assertEqual(column.kind, 'object')
+        self.assertEqual([repr(v) for v in column], ['None', '1', '2', '2.5'])
+        column.append('a')
+        self.assertEqual((column.kind, list(column)), ('object', [None, 1, 2, 2.5, 'a']))
+        self.assertEqual(list(column.take([4, 1])), ['a', 1])
+
+    def test_table(self):
+        """ Columns of Item fields and properties """
+        self.assertEqual(len(self.table), 48)
+        self.assertEqual(self.table.ids, [i.id for i in self.items])
+        self.assertEqual(self.table.properties['eo:cloud_cover'].kind, 'int')
+        self.assertEqual(list(self.table.properties['eo:cloud_cover']),
+                         [i.properties.get('eo:cloud_cover', None) for i in self.items])
+        self.assertEqual(self.table.hrefs('thumbnail'), [i.assets['thumbnail']['href'] for i in self.items])
+        self.assertEqual(self.table.dates(), self.items.dates())
+
+    def test_items(self):
+        """ Convert back to Items """
+        self.assertEqual(self.table.feature(3), self.items[3]._data)
+        item = self.table[2]
+        self.assertEqual(item.id, 'item-2')
+        self.assertEqual(item._collection.id, 'sentinel-2-l1c')
+        items = self.table.to_items()
+        self.assertEqual([i.id for i in items], [i.id for i in self.items])
+        table = ItemTable(features=False)
+        table.extend(self.items)
+        with self.assertRaises(SatSearchError):
+            table.item(0)
+
+    def test_summary(self):
+        """ Summary and calendar the same as ItemCollection """
+        params = ['date', 'id', 'eo:cloud_cover', 'eo:platform']
+        self.assertEqual(self.table.summary(params), self.items.summary(params))
+        self.assertEqual(self.table.summary(), self.items.summary())
+        self.assertEqual(self.table.calendar('eo:platform'), self.items.calendar('eo:platform'))
+        # mixed int and float values, and datetimes printed as given
+        features = [self.items[i]._data for i in range(2)]
+        features[0]['properties'].update({'eo:cloud_cover': 0, 'datetime': '2020-01-01T10:00:00Z'})
+        features[1]['properties'].update({'eo:cloud_cover': 12.5, 'datetime': '2020-01-02T23:00:00.123-05:00'})
+        items = ItemCollection([Item(f) for f in features])
+        table = ItemTable()
+        table.extend(items)
+        params = ['date', 'datetime', 'eo:cloud_cover']
+        self.assertEqual(table.summary(params), items.summary(params))
+        self.assertIn('2020-01-02T23:00:00.123-05:00', table.summary(params))
+        self.assertEqual(len(table.filter(query={'eo:cloud_cover': {'gt': '10'}})), 1)
+
+    def test_filter(self):
+        """ Filter Items """
+        self.assertEqual(len(self.table.filter(collections=['sentinel-2-l1c'])), 16)
+        self.assertEqual(len(self.table.filter(datetime='2020-01-01')), 24)
+        self.assertEqual(len(self.table.filter(datetime='2020-01-01T12:00:00Z/..')), 36)
+        self.assertEqual(self.table.filter(ids=['item-1'], collections=['none']).ids, ['item-1'])
+        bbox = self.items[0].bbox
+        self.assertIn('item-0', self.table.filter(bbox=bbox).ids)
+        self.assertEqual(len(self.table.filter(bbox=[0, 0, 0.1, 0.1])), 0)
+        table = self.table.filter(query={'eo:cloud_cover': {'lte': '5'}})
+        self.assertTrue(all([v <= 5 for v in table.properties['eo:cloud_cover']]))
+        self.assertEqual(len(self.table.filter(query={'eo:platform': {'neq': 'landsat-8'}})), 16)
+
+    def test_sort(self):
+        """ Sort Items """
+        table = self.table.sort([{'field': 'datetime', 'direction': 'desc'}])
+        self.assertEqual(table.ids[0:3], ['item-47', 'item-46', 'item-45'])
+        table = self.table.sort([{'field': 'collection', 'direction': 'asc'}, {'field': 'id', 'direction': 'desc'}])
+        self.assertEqual(table.ids[0], 'item-9')
+
+    def test_search_table(self):
+        """ Build a table from search results """
+        with StacServer(nitems=25, templates=TEMPLATES) as api:
+            table = Search(url=api.url).table(properties=['eo:cloud_cover'])
+        self.assertEqual(len(table), 25)
+        self.assertEqual(list(table.properties), ['eo:cloud_cover'])
+        self.assertEqual(sorted([c.id for c in table._collections]), ['landsat-8-l1', 'sentinel-2-l1c'])